@@ -3,12 +3,18 @@
 Модуль админ-панели для управления ботом через Telegram.
 """
 
+import asyncio
 import logging
 import os
 import json
+import time
+from collections import deque
 from datetime import datetime
-from typing import Optional, Set
+from types import ModuleType
+from typing import Any, BinaryIO, Dict, FrozenSet, Iterable, List, Optional, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
+from telegram.error import BadRequest
 from telegram.ext import (
     ContextTypes,
     CommandHandler,
@@ -19,6 +25,11 @@ from telegram.ext import (
 )
 from database import Database
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 # Состояния для ConversationHandler
@@ -42,16 +53,122 @@ logger = logging.getLogger(__name__)
 
 # Глобальные переменные
 db: Optional[Database] = None
-ADMIN_IDS: Set[int] = set()
+# Модуль бота с кэшем маршрутизации (передается в init_admin)
+bot: Optional[ModuleType] = None
+ADMIN_IDS: FrozenSet[int] = frozenset()
+# Фильтр PTB по администраторам: не-админские апдейты отсекаются до запуска обработчика.
+# Хендлеры создаются раньше init_admin, поэтому фильтр заполняется там же, где ADMIN_IDS.
+ADMIN_USER_FILTER = filters.User()
 DEBUG_MODE: bool = False
 DEBUG_FILE_PATH: str = "debug_updates.txt"
 
-
-def init_admin(database: Database, admin_ids: Set[int]):
-    """Инициализация админ-модуля."""
-    global db, ADMIN_IDS
+# Буферизованная запись дебаг-лога: обработчики только добавляют строки в буфер,
+# фоновая задача раз в DEBUG_FLUSH_INTERVAL секунд (или при заполнении буфера
+# до DEBUG_FLUSH_THRESHOLD строк) записывает их в файл одним блоком.
+# При переполнении буфера самые старые строки отбрасываются.
+DEBUG_FLUSH_INTERVAL: float = 3.0
+DEBUG_FLUSH_THRESHOLD: int = 1000
+DEBUG_BUFFER_MAX_LINES: int = 10_000
+_debug_buffer: deque = deque(maxlen=DEBUG_BUFFER_MAX_LINES)
+_debug_lock = asyncio.Lock()
+_debug_flush_event = asyncio.Event()
+_debug_flusher_task: Optional[asyncio.Task] = None
+_debug_file: Optional[BinaryIO] = None
+
+# Переиспользуемые словари для записи в дебаг-лог: сериализация происходит
+# синхронно до любого await, поэтому один экземпляр безопасен в event loop
+_log_tmp: Dict[str, Any] = {}
+_log_msg_tmp: Dict[str, Any] = {}
+_log_cq_tmp: Dict[str, Any] = {}
+
+# Схлопывание повторов: подряд идущие update с тем же чатом, отправителем и
+# текстом (или данными callback) не пишутся, вместо них пишется одна строка
+# {"repeated": N}. timestamp/update_id/message_id в сравнении не участвуют.
+_last_update_key: Optional[Tuple[Any, ...]] = None
+_repeat_count: int = 0
+
+# Кэш топиков для меню админ-панели (сбрасывается при изменении топиков)
+_topics_cache: Optional[Tuple[Dict[str, int], Dict[str, str], List[str]]] = None
+_topics_cache_version: int = 0
+
+# Сколько секунд снимок топиков в context.user_data считается актуальным
+TOPICS_SNAPSHOT_TTL: float = 30.0
+
+# Количество исходных чатов на одной странице списка
+SOURCE_CHATS_PAGE_SIZE: int = 50
+
+# Максимальная длина названия чата в списке (в UTF-16 единицах, как считает Telegram):
+# строка списка не длиннее ~65 символов, 50 строк с заголовком укладываются в 4096
+SOURCE_CHAT_NAME_MAX_LENGTH: int = 40
+
+# Максимальная длина префикса топика (CHECK topics_prefix_length в БД)
+TOPIC_PREFIX_MAX_LENGTH: int = 16
+
+# Статические клавиатуры и тексты меню (создаются один раз при импорте)
+_MAIN_TEXT = "🔧 <b>Админ-панель</b>\n\nВыберите действие:"
+_TOPICS_HEADER = "📋 <b>Управление топиками</b>"
+_SOURCE_CHATS_HEADER = "💬 <b>Управление исходными чатами</b>"
+
+
+_DEBUG_BTN_ON = InlineKeyboardButton("🔴 Выключить отладку", callback_data="toggle_debug")
+_DEBUG_BTN_OFF = InlineKeyboardButton("🟢 Включить отладку", callback_data="toggle_debug")
+
+
+def _build_main_keyboard(debug_button: InlineKeyboardButton) -> InlineKeyboardMarkup:
+    """Строит клавиатуру главного меню с заданной кнопкой отладки."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("📋 Управление топиками", callback_data="menu_topics")],
+        [InlineKeyboardButton("💬 Управление исходными чатами", callback_data="menu_source_chats")],
+        [InlineKeyboardButton("🎯 Установить целевой чат", callback_data="set_target_chat")],
+        [InlineKeyboardButton("📊 Показать статистику", callback_data="show_stats")],
+        [debug_button],
+        [InlineKeyboardButton("❌ Закрыть", callback_data="close")],
+    ])
+
+
+# Клавиатуры главного меню для включенного и выключенного режима отладки
+_MAIN_KB_ON = _build_main_keyboard(_DEBUG_BTN_ON)
+_MAIN_KB_OFF = _build_main_keyboard(_DEBUG_BTN_OFF)
+
+_TOPICS_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Добавить топик", callback_data="add_topic")],
+    [InlineKeyboardButton("✏️ Редактировать топик", callback_data="edit_topic")],
+    [InlineKeyboardButton("🗑 Удалить топик", callback_data="delete_topic")],
+    [InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")],
+])
+
+_SOURCE_CHATS_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Добавить чат", callback_data="add_source_chat")],
+    [InlineKeyboardButton("🔄 Вкл/Выкл чат", callback_data="toggle_source_chat")],
+    [InlineKeyboardButton("🗑 Удалить чат", callback_data="delete_source_chat")],
+    [InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")],
+])
+
+_BACK_TO_MAIN_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")],
+])
+
+
+def init_admin(database: Database, admin_ids: Iterable[int], bot_module: ModuleType):
+    """
+    Инициализация админ-модуля.
+
+    Args:
+        database: Подключение к базе данных
+        admin_ids: ID администраторов
+        bot_module: Запущенный модуль бота, кэш которого обновляется после изменений
+    """
+    global db, ADMIN_IDS, is_admin, bot
     db = database
-    ADMIN_IDS = admin_ids
+    bot = bot_module
+    ADMIN_IDS = frozenset(admin_ids)
+    # Проверка прав вызывается на каждый update - привязываем её напрямую к множеству
+    is_admin = ADMIN_IDS.__contains__
+    ADMIN_USER_FILTER.user_ids = ADMIN_IDS
+
+    if DEBUG_MODE:
+        _open_debug_file()
+
     logger.info(f"Админ-панель инициализирована. Админов: {len(ADMIN_IDS)}")
 
 
@@ -60,247 +177,282 @@ def is_admin(user_id: int) -> bool:
     return user_id in ADMIN_IDS
 
 
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Обработчик команды /start."""
-    user = update.effective_user
+def _parse_int(value: str) -> Optional[int]:
+    """Преобразует строку в целое число, возвращает None при неверном формате."""
+    value = value.strip()
+    digits = value[1:] if value.startswith('-') else value
+    if not digits.isdecimal():
+        return None
+    return int(value)
 
-    # Если админ - показываем админ-панель
-    if is_admin(user.id):
-        debug_button_text = "🔴 Выключить отладку" if DEBUG_MODE else "🟢 Включить отладку"
-        keyboard = [
-            [InlineKeyboardButton("📋 Управление топиками", callback_data="menu_topics")],
-            [InlineKeyboardButton("💬 Управление исходными чатами", callback_data="menu_source_chats")],
-            [InlineKeyboardButton("🎯 Установить целевой чат", callback_data="set_target_chat")],
-            [InlineKeyboardButton("📊 Показать статистику", callback_data="show_stats")],
-            [InlineKeyboardButton(debug_button_text, callback_data="toggle_debug")],
-            [InlineKeyboardButton("❌ Закрыть", callback_data="close")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
 
-        await update.message.reply_text(
-            "🔧 <b>Админ-панель</b>\n\n"
-            "Выберите действие:",
-            reply_markup=reply_markup,
-            parse_mode="HTML"
-        )
+def prefix_sort_key(prefix: str) -> tuple:
+    """Ключ естественной сортировки префиксов: сначала числовые по значению, затем остальные."""
+    if prefix.isdecimal():
+        return (0, int(prefix), prefix)
+    return (1, 0, prefix)
 
-        return MAIN_MENU
-    else:
-        # Обычный пользователь
-        await update.message.reply_text(
-            "👋 Привет! Я бот для перенаправления сообщений.\n\n"
-            "Отправьте сообщение в формате:\n"
-            "<code>/префикс данные</code>\n\n"
-            "Например: <code>/1 27.5</code>",
-            parse_mode="HTML"
-        )
-        return ConversationHandler.END
 
+async def _get_topics_cached() -> Tuple[Dict[str, int], Dict[str, str], List[str]]:
+    """
+    Возвращает (topics, topic_names, sorted_prefixes) из кэша, при промахе читает из БД.
 
-async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Обработчик команды /admin - показывает главное меню."""
-    user = update.effective_user
+    sorted_prefixes - префиксы топиков, отсортированные один раз при заполнении кэша.
+    """
+    global _topics_cache
 
-    if not is_admin(user.id):
-        await update.message.reply_text("❌ У вас нет прав доступа к админ-панели.")
-        return ConversationHandler.END
+    if _topics_cache is not None:
+        return _topics_cache
 
-    debug_button_text = "🔴 Выключить отладку" if DEBUG_MODE else "🟢 Включить отладку"
-    keyboard = [
-        [InlineKeyboardButton("📋 Управление топиками", callback_data="menu_topics")],
-        [InlineKeyboardButton("💬 Управление исходными чатами", callback_data="menu_source_chats")],
-        [InlineKeyboardButton("🎯 Установить целевой чат", callback_data="set_target_chat")],
-        [InlineKeyboardButton("📊 Показать статистику", callback_data="show_stats")],
-        [InlineKeyboardButton(debug_button_text, callback_data="toggle_debug")],
-        [InlineKeyboardButton("❌ Закрыть", callback_data="close")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    version = _topics_cache_version
+    topics, topic_names = await db.get_topics_full()
+    result = (topics, topic_names, sorted(topics, key=prefix_sort_key))
 
-    await update.message.reply_text(
-        "🔧 <b>Админ-панель</b>\n\n"
-        "Выберите действие:",
-        reply_markup=reply_markup,
-        parse_mode="HTML"
-    )
+    # Если топики изменились во время чтения, результат мог устареть - не кэшируем его
+    if version == _topics_cache_version:
+        _topics_cache = result
+    return result
 
-    return MAIN_MENU
 
+def _invalidate_topics_cache() -> None:
+    """Сбрасывает кэш топиков после изменения данных."""
+    global _topics_cache, _topics_cache_version
+    _topics_cache = None
+    _topics_cache_version += 1
 
-async def show_main_menu_after_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Показывает главное меню после выполнения действия (без callback query)."""
-    debug_button_text = "🔴 Выключить отладку" if DEBUG_MODE else "🟢 Включить отладку"
-    keyboard = [
-        [InlineKeyboardButton("📋 Управление топиками", callback_data="menu_topics")],
-        [InlineKeyboardButton("💬 Управление исходными чатами", callback_data="menu_source_chats")],
-        [InlineKeyboardButton("🎯 Установить целевой чат", callback_data="set_target_chat")],
-        [InlineKeyboardButton("📊 Показать статистику", callback_data="show_stats")],
-        [InlineKeyboardButton(debug_button_text, callback_data="toggle_debug")],
-        [InlineKeyboardButton("❌ Закрыть", callback_data="close")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await update.message.reply_text(
-        "🔧 <b>Админ-панель</b>\n\n"
-        "Выберите действие:",
-        reply_markup=reply_markup,
-        parse_mode="HTML"
+def _store_topics_snapshot(context: ContextTypes.DEFAULT_TYPE, key: str,
+                           topics: Dict[str, int], topic_names: Dict[str, str]) -> None:
+    """Сохраняет показанный пользователю список топиков для следующего шага диалога."""
+    context.user_data[key] = (topics, topic_names, time.monotonic())
+
+
+async def _get_topics_snapshot(context: ContextTypes.DEFAULT_TYPE,
+                               key: str) -> Tuple[Dict[str, int], Dict[str, str]]:
+    """Возвращает снимок топиков из context.user_data или свежие данные, если он устарел."""
+    snapshot = context.user_data.get(key)
+    if snapshot is not None and time.monotonic() - snapshot[2] < TOPICS_SNAPSHOT_TTL:
+        return snapshot[0], snapshot[1]
+    topics, topic_names, _ = await _get_topics_cached()
+    return topics, topic_names
+
+
+async def _sync_topic(prefix: str) -> None:
+    """Сбрасывает кэш топиков и обновляет топик в кэше бота."""
+    _invalidate_topics_cache()
+    if not await bot.invalidate_topic(prefix):
+        await bot.load_data_from_db()
+
+
+async def _sync_source_chat(chat_id: int) -> None:
+    """Обновляет исходный чат в кэше бота."""
+    if not await bot.invalidate_source_chat(chat_id):
+        await bot.load_data_from_db()
+
+
+async def _fetch_source_chats_page(context: ContextTypes.DEFAULT_TYPE) -> Tuple[list, int, int]:
+    """
+    Получает текущую страницу исходных чатов.
+
+    Номер страницы хранится в context.user_data['src_page'] и приводится
+    к допустимому диапазону.
+
+    Returns:
+        Кортеж (chats, total, page)
+    """
+    page = context.user_data.get('src_page', 0)
+
+    chats, total = await asyncio.gather(
+        db.get_source_chats_page(SOURCE_CHATS_PAGE_SIZE, page * SOURCE_CHATS_PAGE_SIZE),
+        db.count_source_chats(),
     )
 
-    return MAIN_MENU
+    last_page = _source_chats_pages_count(total) - 1
+    if page > last_page:
+        # Страница исчезла (например, после удаления) - показываем последнюю
+        page = last_page
+        chats = await db.get_source_chats_page(SOURCE_CHATS_PAGE_SIZE, page * SOURCE_CHATS_PAGE_SIZE)
 
+    context.user_data['src_page'] = page
+    return chats, total, page
 
-async def show_topics_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Показывает меню управления топиками."""
-    global db
 
-    query = update.callback_query
-    await query.answer()
+def _source_chats_pages_count(total: int) -> int:
+    """Возвращает количество страниц в списке исходных чатов."""
+    return max(1, -(-total // SOURCE_CHATS_PAGE_SIZE))
 
-    if db is None:
-        await query.edit_message_text("❌ База данных не инициализирована.")
-        return ConversationHandler.END
 
-    # Получаем список топиков
-    topics = await db.get_topics()
-    topic_names = await db.get_topic_names()
+def _source_chats_nav_row(page: int, total: int) -> list:
+    """Строит ряд кнопок пагинации (пустой, если страница одна)."""
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton("◀️", callback_data="src_page_prev"))
+    if page + 1 < _source_chats_pages_count(total):
+        row.append(InlineKeyboardButton("▶️", callback_data="src_page_next"))
+    return row
 
-    text = "📋 <b>Управление топиками</b>\n\n"
-    text += f"Всего топиков: {len(topics)}\n\n"
 
-    if topics:
-        text += "<b>Список топиков:</b>\n"
-        for prefix in sorted(topics.keys()):
-            name = topic_names.get(prefix, "—")
-            topic_id = topics[prefix]
-            text += f"/{prefix} → {name} (ID: {topic_id})\n"
+def _source_chats_keyboard(page: int, total: int) -> InlineKeyboardMarkup:
+    """Возвращает клавиатуру меню исходных чатов с пагинацией при необходимости."""
+    nav_row = _source_chats_nav_row(page, total)
+    if not nav_row:
+        return _SOURCE_CHATS_KB
+    return InlineKeyboardMarkup([nav_row, *_SOURCE_CHATS_KB.inline_keyboard])
+
+
+def _short_chat_name(name: Optional[str]) -> str:
+    """Возвращает название чата для списка, обрезанное до SOURCE_CHAT_NAME_MAX_LENGTH."""
+    if not name:
+        return 'Без названия'
+    if len(name.encode('utf-16-le')) // 2 <= SOURCE_CHAT_NAME_MAX_LENGTH:
+        return name
+
+    out = []
+    units = 0
+    for char in name:
+        units += 2 if ord(char) > 0xFFFF else 1
+        if units > SOURCE_CHAT_NAME_MAX_LENGTH - 1:
+            break
+        out.append(char)
+    return ''.join(out) + '…'
+
+
+def _source_chats_menu_text(chats: list, total: int, page: int) -> str:
+    """Формирует текст меню исходных чатов для текущей страницы."""
+    lines = [_SOURCE_CHATS_HEADER, "", f"Всего чатов: {total}", ""]
+
+    if chats:
+        pages = _source_chats_pages_count(total)
+        if pages > 1:
+            lines.append(f"<b>Список чатов</b> (страница {page + 1} из {pages}):")
+        else:
+            lines.append("<b>Список чатов:</b>")
+        lines.extend(
+            f"{'✅' if chat['is_active'] else '❌'} {_short_chat_name(chat['name'])}: {chat['chat_id']}"
+            for chat in chats
+        )
     else:
-        text += "Топики отсутствуют.\n"
+        lines.append("Исходные чаты отсутствуют.")
 
-    keyboard = [
-        [InlineKeyboardButton("➕ Добавить топик", callback_data="add_topic")],
-        [InlineKeyboardButton("✏️ Редактировать топик", callback_data="edit_topic")],
-        [InlineKeyboardButton("🗑 Удалить топик", callback_data="delete_topic")],
-        [InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    return "\n".join(lines)
 
-    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="HTML")
-    return TOPICS_MENU
 
+async def _show(update: Update, text: str, *, edit: bool,
+                reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
+    """Редактирует сообщение с кнопками (edit=True) или отвечает новым сообщением."""
+    if not edit:
+        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
+        return
+
+    try:
+        await update.callback_query.edit_message_text(text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
+    except BadRequest as e:
+        # Повторное нажатие той же кнопки: экран уже показан, менять нечего
+        if "message is not modified" not in str(e).lower():
+            raise
+
+
+async def _send_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, *, edit: bool) -> int:
+    """Показывает главное меню админ-панели."""
+    reply_markup = _MAIN_KB_ON if DEBUG_MODE else _MAIN_KB_OFF
+    await _show(update, _MAIN_TEXT, edit=edit, reply_markup=reply_markup)
+    return MAIN_MENU
 
-async def show_topics_menu_after_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Показывает меню топиков после выполнения действия (без callback query)."""
-    global db
 
+async def _send_topics_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, *, edit: bool) -> int:
+    """Показывает меню управления топиками."""
     if db is None:
-        await update.message.reply_text("❌ База данных не инициализирована.")
+        await _show(update, "❌ База данных не инициализирована.", edit=edit)
         return ConversationHandler.END
 
     # Получаем список топиков
-    topics = await db.get_topics()
-    topic_names = await db.get_topic_names()
+    topics, topic_names, sorted_prefixes = await _get_topics_cached()
 
-    text = "📋 <b>Управление топиками</b>\n\n"
-    text += f"Всего топиков: {len(topics)}\n\n"
+    lines = [_TOPICS_HEADER, "", f"Всего топиков: {len(topics)}", ""]
 
     if topics:
-        text += "<b>Список топиков:</b>\n"
-        for prefix in sorted(topics.keys()):
-            name = topic_names.get(prefix, "—")
-            topic_id = topics[prefix]
-            text += f"/{prefix} → {name} (ID: {topic_id})\n"
+        lines.append("<b>Список топиков:</b>")
+        lines.extend(
+            f"/{prefix} → {topic_names.get(prefix, '—')} (ID: {topics[prefix]})"
+            for prefix in sorted_prefixes
+        )
     else:
-        text += "Топики отсутствуют.\n"
-
-    keyboard = [
-        [InlineKeyboardButton("➕ Добавить топик", callback_data="add_topic")],
-        [InlineKeyboardButton("✏️ Редактировать топик", callback_data="edit_topic")],
-        [InlineKeyboardButton("🗑 Удалить топик", callback_data="delete_topic")],
-        [InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+        lines.append("Топики отсутствуют.")
 
-    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode="HTML")
+    await _show(update, "\n".join(lines), edit=edit, reply_markup=_TOPICS_KB)
     return TOPICS_MENU
 
 
-async def show_source_chats_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def _send_source_chats_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, *, edit: bool) -> int:
     """Показывает меню управления исходными чатами."""
-    global db
-
-    query = update.callback_query
-    await query.answer()
-
     if db is None:
-        await query.edit_message_text("❌ База данных не инициализирована.")
+        await _show(update, "❌ База данных не инициализирована.", edit=edit)
         return ConversationHandler.END
 
-    # Получаем список чатов из БД
-    async with db.pool.acquire() as conn:
-        chats = await conn.fetch(
-            "SELECT chat_id, name, is_active FROM source_chats ORDER BY name"
-        )
+    # Получаем текущую страницу чатов из БД
+    chats, total, page = await _fetch_source_chats_page(context)
+    text = _source_chats_menu_text(chats, total, page)
 
-    text = "💬 <b>Управление исходными чатами</b>\n\n"
-    text += f"Всего чатов: {len(chats)}\n\n"
+    await _show(update, text, edit=edit, reply_markup=_source_chats_keyboard(page, total))
+    return SOURCE_CHATS_MENU
 
-    if chats:
-        text += "<b>Список чатов:</b>\n"
-        for chat in chats:
-            status = "✅" if chat['is_active'] else "❌"
-            name = chat['name'] or "Без названия"
-            text += f"{status} {name}: {chat['chat_id']}\n"
-    else:
-        text += "Исходные чаты отсутствуют.\n"
 
-    keyboard = [
-        [InlineKeyboardButton("➕ Добавить чат", callback_data="add_source_chat")],
-        [InlineKeyboardButton("🔄 Вкл/Выкл чат", callback_data="toggle_source_chat")],
-        [InlineKeyboardButton("🗑 Удалить чат", callback_data="delete_source_chat")],
-        [InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Обработчик команды /start."""
+    # Если админ - показываем админ-панель
+    if is_admin(update.effective_user.id):
+        return await _send_main_menu(update, context, edit=False)
+
+    # Обычный пользователь
+    await update.message.reply_text(
+        "👋 Привет! Я бот для перенаправления сообщений.\n\n"
+        "Отправьте сообщение в формате:\n"
+        "<code>/префикс данные</code>\n\n"
+        "Например: <code>/1 27.5</code>",
+        parse_mode=ParseMode.HTML
+    )
+    return ConversationHandler.END
 
-    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="HTML")
-    return SOURCE_CHATS_MENU
 
+async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Обработчик команды /admin - показывает главное меню (только для ADMIN_USER_FILTER)."""
+    return await _send_main_menu(update, context, edit=False)
 
-async def show_source_chats_menu_after_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Показывает меню исходных чатов после выполнения действия (без callback query)."""
-    global db
 
-    if db is None:
-        await update.message.reply_text("❌ База данных не инициализирована.")
-        return ConversationHandler.END
+async def ignore_admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """
+    Обработчик команды /admin от не-админов: молча игнорирует ее.
 
-    # Получаем список чатов из БД
-    async with db.pool.acquire() as conn:
-        chats = await conn.fetch(
-            "SELECT chat_id, name, is_active FROM source_chats ORDER BY name"
-        )
+    Без него команда доходила бы до handle_message и получала ответ про неизвестный префикс.
+    """
+    return ConversationHandler.END
 
-    text = "💬 <b>Управление исходными чатами</b>\n\n"
-    text += f"Всего чатов: {len(chats)}\n\n"
 
-    if chats:
-        text += "<b>Список чатов:</b>\n"
-        for chat in chats:
-            status = "✅" if chat['is_active'] else "❌"
-            name = chat['name'] or "Без названия"
-            text += f"{status} {name}: {chat['chat_id']}\n"
-    else:
-        text += "Исходные чаты отсутствуют.\n"
+async def show_main_menu_after_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Показывает главное меню после выполнения действия (без callback query)."""
+    return await _send_main_menu(update, context, edit=False)
 
-    keyboard = [
-        [InlineKeyboardButton("➕ Добавить чат", callback_data="add_source_chat")],
-        [InlineKeyboardButton("🔄 Вкл/Выкл чат", callback_data="toggle_source_chat")],
-        [InlineKeyboardButton("🗑 Удалить чат", callback_data="delete_source_chat")],
-        [InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await update.message.reply_text(text, reply_markup=reply_markup, parse_mode="HTML")
-    return SOURCE_CHATS_MENU
+async def show_topics_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Показывает меню управления топиками."""
+    await update.callback_query.answer()
+    return await _send_topics_menu(update, context, edit=True)
+
+
+async def show_topics_menu_after_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Показывает меню топиков после выполнения действия (без callback query)."""
+    return await _send_topics_menu(update, context, edit=False)
+
+
+async def show_source_chats_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Показывает меню управления исходными чатами."""
+    await update.callback_query.answer()
+    return await _send_source_chats_menu(update, context, edit=True)
+
+
+async def show_source_chats_menu_after_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Показывает меню исходных чатов после выполнения действия (без callback query)."""
+    return await _send_source_chats_menu(update, context, edit=False)
 
 
 async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -314,9 +466,11 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await query.edit_message_text("❌ База данных не инициализирована.")
         return ConversationHandler.END
 
-    config = await db.get_all_config()
-    topics = await db.get_topics()
-    source_chats = await db.get_source_chats()
+    config, (topics, _, _), source_chats = await asyncio.gather(
+        db.get_all_config(),
+        _get_topics_cached(),
+        db.get_source_chats(),
+    )
 
     target_chat_id = config.get('target_chat_id', 'Не установлен')
 
@@ -325,10 +479,7 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     text += f"<b>Исходных чатов (активных):</b> {len(source_chats)}\n"
     text += f"<b>Целевой чат:</b> {target_chat_id}\n"
 
-    keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode="HTML")
+    await query.edit_message_text(text, reply_markup=_BACK_TO_MAIN_KB, parse_mode=ParseMode.HTML)
     return MAIN_MENU
 
 
@@ -342,8 +493,9 @@ async def start_add_topic(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         "Отправьте данные в формате:\n"
         "<code>префикс:название:topic_id</code>\n\n"
         "Пример: <code>1:Скай:289</code>\n\n"
+        "Можно отправить несколько топиков, по одному на строку.\n"
         "Или отправьте /cancel для отмены.",
-        parse_mode="HTML"
+        parse_mode=ParseMode.HTML
     )
 
     return WAITING_TOPIC_DATA
@@ -355,28 +507,41 @@ async def process_add_topic(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
     text = update.message.text.strip()
 
-    if ':' not in text or text.count(':') != 2:
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) > 1:
+        return await _process_add_topics_bulk(update, context, lines)
+
+    parts = text.split(':', 2)
+    if len(parts) != 3:
         await update.message.reply_text(
             "❌ Неверный формат. Используйте:\n"
             "<code>префикс:название:topic_id</code>",
-            parse_mode="HTML"
+            parse_mode=ParseMode.HTML
         )
         return WAITING_TOPIC_DATA
 
-    try:
-        prefix, name, topic_id_str = text.split(':', 2)
-        topic_id = int(topic_id_str)
+    prefix, name, topic_id_str = (part.strip() for part in parts)
+    topic_id = _parse_int(topic_id_str)
+    if topic_id is None:
+        await update.message.reply_text("❌ topic_id должен быть числом.")
+        return WAITING_TOPIC_DATA
 
+    if len(prefix) > TOPIC_PREFIX_MAX_LENGTH:
+        await update.message.reply_text(
+            f"❌ Префикс не может быть длиннее {TOPIC_PREFIX_MAX_LENGTH} символов."
+        )
+        return WAITING_TOPIC_DATA
+
+    try:
         if db is None:
             await update.message.reply_text("❌ База данных не инициализирована.")
             return ConversationHandler.END
 
-        success = await db.add_topic(prefix.strip(), name.strip(), topic_id)
+        success = await db.add_topic(prefix, name, topic_id)
 
         if success:
-            # Перезагружаем данные в боте
-            import bot
-            await bot.load_data_from_db()
+            # Обновляем данные в боте
+            await _sync_topic(prefix)
 
             await update.message.reply_text(
                 f"✅ Топик успешно добавлен!\n"
@@ -386,9 +551,6 @@ async def process_add_topic(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text(
                 f"❌ Топик с префиксом '{prefix}' уже существует."
             )
-    except ValueError:
-        await update.message.reply_text("❌ topic_id должен быть числом.")
-        return WAITING_TOPIC_DATA
     except Exception as e:
         logger.error(f"Ошибка добавления топика: {e}", exc_info=True)
         await update.message.reply_text(f"❌ Ошибка: {e}")
@@ -397,6 +559,52 @@ async def process_add_topic(update: Update, context: ContextTypes.DEFAULT_TYPE)
     return await show_topics_menu_after_action(update, context)
 
 
+async def _process_add_topics_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                   lines: List[str]) -> int:
+    """Обработка добавления нескольких топиков (по одному на строку)."""
+    rows = []
+    bad_lines = []
+    for line in lines:
+        parts = line.split(':', 2)
+        topic_id = _parse_int(parts[2].strip()) if len(parts) == 3 else None
+        prefix = parts[0].strip()
+        if topic_id is None or len(prefix) > TOPIC_PREFIX_MAX_LENGTH:
+            bad_lines.append(line)
+            continue
+        rows.append((prefix, parts[1].strip(), topic_id))
+
+    if bad_lines:
+        await update.message.reply_text(
+            "❌ Неверный формат строк (ожидается префикс:название:topic_id):\n"
+            + "\n".join(bad_lines)
+        )
+        return WAITING_TOPIC_DATA
+
+    try:
+        if db is None:
+            await update.message.reply_text("❌ База данных не инициализирована.")
+            return ConversationHandler.END
+
+        added = await db.bulk_add_topics(rows)
+
+        if added:
+            # Обновляем данные в боте целиком: изменилось сразу несколько топиков
+            _invalidate_topics_cache()
+            await bot.load_data_from_db()
+
+        skipped = len(rows) - len(added)
+        text = f"✅ Добавлено топиков: {len(added)}"
+        if skipped:
+            text += f"\n❌ Пропущено (префикс уже существует): {skipped}"
+        await update.message.reply_text(text)
+    except Exception as e:
+        logger.error(f"Ошибка добавления топиков: {e}", exc_info=True)
+        await update.message.reply_text(f"❌ Ошибка: {e}")
+
+    # Возвращаем в меню топиков
+    return await show_topics_menu_after_action(update, context)
+
+
 async def start_delete_topic(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Начало процесса удаления топика."""
     global db
@@ -408,23 +616,22 @@ async def start_delete_topic(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await query.edit_message_text("❌ База данных не инициализирована.")
         return ConversationHandler.END
 
-    topics = await db.get_topics()
-    topic_names = await db.get_topic_names()
+    topics, topic_names, sorted_prefixes = await _get_topics_cached()
 
     if not topics:
         await query.edit_message_text("❌ Нет топиков для удаления.")
         return ConversationHandler.END
 
-    text = "🗑 <b>Удаление топика</b>\n\n"
-    text += "Отправьте префикс топика для удаления:\n\n"
+    _store_topics_snapshot(context, '_delete_snapshot', topics, topic_names)
 
-    for prefix in sorted(topics.keys()):
-        name = topic_names.get(prefix, "—")
-        text += f"/{prefix} → {name}\n"
+    lines = ["🗑 <b>Удаление топика</b>", "", "Отправьте префикс топика для удаления:", ""]
+    lines.extend(f"/{prefix} → {topic_names.get(prefix, '—')}" for prefix in sorted_prefixes)
+    lines.append("")
+    lines.append("Или отправьте /cancel для отмены.")
 
-    text += "\nИли отправьте /cancel для отмены."
+    text = "\n".join(lines)
 
-    await query.edit_message_text(text, parse_mode="HTML")
+    await query.edit_message_text(text, parse_mode=ParseMode.HTML)
     return WAITING_TOPIC_PREFIX
 
 
@@ -438,12 +645,16 @@ async def process_delete_topic(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("❌ База данных не инициализирована.")
         return ConversationHandler.END
 
-    success = await db.delete_topic(prefix)
+    # Топика нет в только что показанном списке - не обращаемся к БД
+    topics, _ = await _get_topics_snapshot(context, '_delete_snapshot')
+    context.user_data.pop('_delete_snapshot', None)
+
+    # Ключи снимка в нижнем регистре (как в кэше бота), в БД префикс может быть любым
+    success = prefix.lower() in topics and await db.delete_topic(prefix)
 
     if success:
-        # Перезагружаем данные в боте
-        import bot
-        await bot.load_data_from_db()
+        # Обновляем данные в боте
+        await _sync_topic(prefix)
 
         await update.message.reply_text(f"✅ Топик /{prefix} успешно удален.")
     else:
@@ -464,24 +675,25 @@ async def start_edit_topic(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         await query.edit_message_text("❌ База данных не инициализирована.")
         return ConversationHandler.END
 
-    topics = await db.get_topics()
-    topic_names = await db.get_topic_names()
+    topics, topic_names, sorted_prefixes = await _get_topics_cached()
 
     if not topics:
         await query.edit_message_text("❌ Нет топиков для редактирования.")
         return ConversationHandler.END
 
-    text = "✏️ <b>Редактирование топика</b>\n\n"
-    text += "Отправьте префикс топика, который хотите отредактировать:\n\n"
+    _store_topics_snapshot(context, '_edit_snapshot', topics, topic_names)
 
-    for prefix in sorted(topics.keys()):
-        name = topic_names.get(prefix, "—")
-        topic_id = topics[prefix]
-        text += f"/{prefix} → {name} (ID: {topic_id})\n"
+    lines = ["✏️ <b>Редактирование топика</b>", "", "Отправьте префикс топика, который хотите отредактировать:", ""]
+    lines.extend(
+        f"/{prefix} → {topic_names.get(prefix, '—')} (ID: {topics[prefix]})"
+        for prefix in sorted_prefixes
+    )
+    lines.append("")
+    lines.append("Или отправьте /cancel для отмены.")
 
-    text += "\nИли отправьте /cancel для отмены."
+    text = "\n".join(lines)
 
-    await query.edit_message_text(text, parse_mode="HTML")
+    await query.edit_message_text(text, parse_mode=ParseMode.HTML)
     return WAITING_TOPIC_EDIT_PREFIX
 
 
@@ -495,18 +707,19 @@ async def process_edit_topic_prefix(update: Update, context: ContextTypes.DEFAUL
         await update.message.reply_text("❌ База данных не инициализирована.")
         return ConversationHandler.END
 
-    topics = await db.get_topics()
-    topic_names = await db.get_topic_names()
+    topics, topic_names = await _get_topics_snapshot(context, '_edit_snapshot')
 
-    if prefix not in topics:
+    # Ключи снимка в нижнем регистре, как и при удалении
+    key = prefix.lower()
+    if key not in topics:
         await update.message.reply_text(f"❌ Топик /{prefix} не найден. Попробуйте снова или /cancel для отмены.")
         return WAITING_TOPIC_EDIT_PREFIX
 
     # Сохраняем префикс в context для следующего шага
     context.user_data['edit_prefix'] = prefix
 
-    current_name = topic_names.get(prefix, "—")
-    current_topic_id = topics[prefix]
+    current_name = topic_names.get(key, "—")
+    current_topic_id = topics[key]
 
     await update.message.reply_text(
         f"✏️ <b>Редактирование топика /{prefix}</b>\n\n"
@@ -517,7 +730,7 @@ async def process_edit_topic_prefix(update: Update, context: ContextTypes.DEFAUL
         f"<code>название:topic_id</code>\n\n"
         f"Пример: <code>Новое название:456</code>\n\n"
         f"Или отправьте /cancel для отмены.",
-        parse_mode="HTML"
+        parse_mode=ParseMode.HTML
     )
 
     return WAITING_TOPIC_EDIT_DATA
@@ -534,18 +747,22 @@ async def process_edit_topic_data(update: Update, context: ContextTypes.DEFAULT_
         await update.message.reply_text("❌ Ошибка: префикс не найден. Начните заново.")
         return ConversationHandler.END
 
-    if ':' not in text:
+    parts = text.split(':', 1)
+    if len(parts) != 2:
         await update.message.reply_text(
             "❌ Неверный формат. Используйте:\n"
             "<code>название:topic_id</code>",
-            parse_mode="HTML"
+            parse_mode=ParseMode.HTML
         )
         return WAITING_TOPIC_EDIT_DATA
 
-    try:
-        name, topic_id_str = text.split(':', 1)
-        topic_id = int(topic_id_str)
+    name, topic_id_str = parts
+    topic_id = _parse_int(topic_id_str)
+    if topic_id is None:
+        await update.message.reply_text("❌ topic_id должен быть числом.")
+        return WAITING_TOPIC_EDIT_DATA
 
+    try:
         if db is None:
             await update.message.reply_text("❌ База данных не инициализирована.")
             return ConversationHandler.END
@@ -553,9 +770,8 @@ async def process_edit_topic_data(update: Update, context: ContextTypes.DEFAULT_
         success = await db.update_topic(prefix, name.strip(), topic_id)
 
         if success:
-            # Перезагружаем данные в боте
-            import bot
-            await bot.load_data_from_db()
+            # Обновляем данные в боте
+            await _sync_topic(prefix)
 
             await update.message.reply_text(
                 f"✅ Топик успешно обновлен!\n"
@@ -566,14 +782,13 @@ async def process_edit_topic_data(update: Update, context: ContextTypes.DEFAULT_
 
         # Очищаем данные из context
         context.user_data.pop('edit_prefix', None)
+        context.user_data.pop('_edit_snapshot', None)
 
-    except ValueError:
-        await update.message.reply_text("❌ topic_id должен быть числом.")
-        return WAITING_TOPIC_EDIT_DATA
     except Exception as e:
         logger.error(f"Ошибка редактирования топика: {e}", exc_info=True)
         await update.message.reply_text(f"❌ Ошибка: {e}")
         context.user_data.pop('edit_prefix', None)
+        context.user_data.pop('_edit_snapshot', None)
 
     # Возвращаем в меню топиков
     return await show_topics_menu_after_action(update, context)
@@ -590,7 +805,7 @@ async def start_add_source_chat(update: Update, context: ContextTypes.DEFAULT_TY
         "<code>chat_id:название</code>\n\n"
         "Пример: <code>-1001234567890:Мой чат</code>\n\n"
         "Или отправьте /cancel для отмены.",
-        parse_mode="HTML"
+        parse_mode=ParseMode.HTML
     )
 
     return WAITING_SOURCE_CHAT_DATA
@@ -602,27 +817,31 @@ async def process_add_source_chat(update: Update, context: ContextTypes.DEFAULT_
 
     text = update.message.text.strip()
 
-    if ':' not in text:
+    parts = text.split(':', 1)
+    if len(parts) != 2:
         await update.message.reply_text(
             "❌ Неверный формат. Используйте:\n"
             "<code>chat_id:название</code>",
-            parse_mode="HTML"
+            parse_mode=ParseMode.HTML
         )
         return WAITING_SOURCE_CHAT_DATA
 
-    try:
-        chat_id, name = text.split(':', 1)
+    chat_id_str, name = (part.strip() for part in parts)
+    chat_id = _parse_int(chat_id_str)
+    if chat_id is None:
+        await update.message.reply_text("❌ chat_id должен быть числом.")
+        return WAITING_SOURCE_CHAT_DATA
 
+    try:
         if db is None:
             await update.message.reply_text("❌ База данных не инициализирована.")
             return ConversationHandler.END
 
-        success = await db.add_source_chat(chat_id.strip(), name.strip())
+        success = await db.add_source_chat(chat_id, name)
 
         if success:
-            # Перезагружаем данные в боте
-            import bot
-            await bot.load_data_from_db()
+            # Обновляем данные в боте
+            await _sync_source_chat(chat_id)
 
             await update.message.reply_text(
                 f"✅ Исходный чат успешно добавлен!\n"
@@ -651,49 +870,76 @@ async def start_delete_source_chat(update: Update, context: ContextTypes.DEFAULT
         await query.edit_message_text("❌ База данных не инициализирована.")
         return ConversationHandler.END
 
-    async with db.pool.acquire() as conn:
-        chats = await conn.fetch(
-            "SELECT chat_id, name FROM source_chats ORDER BY name"
-        )
+    chats, total, page = await _fetch_source_chats_page(context)
 
     if not chats:
         await query.edit_message_text("❌ Нет чатов для удаления.")
         return ConversationHandler.END
 
-    text = "🗑 <b>Удаление исходного чата</b>\n\n"
-    text += "Отправьте chat_id для удаления:\n\n"
+    lines = ["🗑 <b>Удаление исходного чата</b>", "", "Отправьте chat_id для удаления:", ""]
+    pages = _source_chats_pages_count(total)
+    if pages > 1:
+        lines.append(f"Страница {page + 1} из {pages}:")
+    lines.extend(f"{_short_chat_name(chat['name'])}: <code>{chat['chat_id']}</code>" for chat in chats)
+    lines.append("")
+    lines.append("Или отправьте /cancel для отмены.")
 
-    for chat in chats:
-        name = chat['name'] or "Без названия"
-        text += f"{name}: <code>{chat['chat_id']}</code>\n"
+    text = "\n".join(lines)
 
-    text += "\nИли отправьте /cancel для отмены."
+    nav_row = _source_chats_nav_row(page, total)
+    reply_markup = InlineKeyboardMarkup([nav_row]) if nav_row else None
 
-    await query.edit_message_text(text, parse_mode="HTML")
+    await query.edit_message_text(text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
     return DELETE_SOURCE_CHAT
 
 
+def _shift_source_chats_page(context: ContextTypes.DEFAULT_TYPE, delta: int) -> None:
+    """Сдвигает текущую страницу списка исходных чатов."""
+    context.user_data['src_page'] = max(0, context.user_data.get('src_page', 0) + delta)
+
+
+async def source_chats_next_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Следующая страница меню исходных чатов."""
+    _shift_source_chats_page(context, 1)
+    return await show_source_chats_menu(update, context)
+
+
+async def source_chats_prev_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Предыдущая страница меню исходных чатов."""
+    _shift_source_chats_page(context, -1)
+    return await show_source_chats_menu(update, context)
+
+
+async def delete_source_chat_next_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Следующая страница списка чатов для удаления."""
+    _shift_source_chats_page(context, 1)
+    return await start_delete_source_chat(update, context)
+
+
+async def delete_source_chat_prev_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Предыдущая страница списка чатов для удаления."""
+    _shift_source_chats_page(context, -1)
+    return await start_delete_source_chat(update, context)
+
+
 async def process_delete_source_chat(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обработка удаления исходного чата."""
     global db
 
-    chat_id = update.message.text.strip()
+    chat_id = _parse_int(update.message.text)
+    if chat_id is None:
+        await update.message.reply_text("❌ chat_id должен быть числом.")
+        return DELETE_SOURCE_CHAT
 
     if db is None:
         await update.message.reply_text("❌ База данных не инициализирована.")
         return ConversationHandler.END
 
-    async with db.pool.acquire() as conn:
-        result = await conn.execute(
-            "DELETE FROM source_chats WHERE chat_id = $1", chat_id
-        )
-
-    success = result.split()[-1] == '1'
+    success = await db.delete_source_chat(chat_id)
 
     if success:
-        # Перезагружаем данные в боте
-        import bot
-        await bot.load_data_from_db()
+        # Обновляем данные в боте
+        await _sync_source_chat(chat_id)
 
         await update.message.reply_text(f"✅ Чат {chat_id} успешно удален.")
     else:
@@ -722,7 +968,7 @@ async def start_set_target_chat(update: Update, context: ContextTypes.DEFAULT_TY
         f"Текущий: <code>{current_target}</code>\n\n"
         f"Отправьте новый chat_id целевого чата\n"
         f"или /cancel для отмены.",
-        parse_mode="HTML"
+        parse_mode=ParseMode.HTML
     )
 
     return SET_TARGET_CHAT
@@ -741,9 +987,8 @@ async def process_set_target_chat(update: Update, context: ContextTypes.DEFAULT_
     try:
         await db.set_config('target_chat_id', chat_id)
 
-        # Перезагружаем данные в боте
-        import bot
-        await bot.load_data_from_db()
+        # Обновляем данные в боте
+        bot.set_target_chat(chat_id)
 
         await update.message.reply_text(
             f"✅ Целевой чат успешно установлен: {chat_id}"
@@ -758,28 +1003,8 @@ async def process_set_target_chat(update: Update, context: ContextTypes.DEFAULT_
 
 async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Возврат в главное меню."""
-    query = update.callback_query
-    await query.answer()
-
-    debug_button_text = "🔴 Выключить отладку" if DEBUG_MODE else "🟢 Включить отладку"
-    keyboard = [
-        [InlineKeyboardButton("📋 Управление топиками", callback_data="menu_topics")],
-        [InlineKeyboardButton("💬 Управление исходными чатами", callback_data="menu_source_chats")],
-        [InlineKeyboardButton("🎯 Установить целевой чат", callback_data="set_target_chat")],
-        [InlineKeyboardButton("📊 Показать статистику", callback_data="show_stats")],
-        [InlineKeyboardButton(debug_button_text, callback_data="toggle_debug")],
-        [InlineKeyboardButton("❌ Закрыть", callback_data="close")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    await query.edit_message_text(
-        "🔧 <b>Админ-панель</b>\n\n"
-        "Выберите действие:",
-        reply_markup=reply_markup,
-        parse_mode="HTML"
-    )
-
-    return MAIN_MENU
+    await update.callback_query.answer()
+    return await _send_main_menu(update, context, edit=True)
 
 
 async def close_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -797,84 +1022,165 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 
 async def handle_unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Обработчик неизвестных команд для админов."""
-    user = update.effective_user
+    """Обработчик неизвестных команд для админов (только для ADMIN_USER_FILTER)."""
+    # Показываем админ-панель
+    return await _send_main_menu(update, context, edit=False)
 
-    # Проверяем, является ли пользователь админом
-    if not is_admin(user.id):
-        return ConversationHandler.END
 
-    # Показываем админ-панель
-    debug_button_text = "🔴 Выключить отладку" if DEBUG_MODE else "🟢 Включить отладку"
-    keyboard = [
-        [InlineKeyboardButton("📋 Управление топиками", callback_data="menu_topics")],
-        [InlineKeyboardButton("💬 Управление исходными чатами", callback_data="menu_source_chats")],
-        [InlineKeyboardButton("🎯 Установить целевой чат", callback_data="set_target_chat")],
-        [InlineKeyboardButton("📊 Показать статистику", callback_data="show_stats")],
-        [InlineKeyboardButton(debug_button_text, callback_data="toggle_debug")],
-        [InlineKeyboardButton("❌ Закрыть", callback_data="close")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+def _open_debug_file() -> None:
+    """Открывает файл дебаг-лога на дозапись."""
+    global _debug_file
+    if _debug_file is None:
+        _debug_file = open(DEBUG_FILE_PATH, "ab", buffering=1 << 16)
 
-    await update.message.reply_text(
-        "🔧 <b>Админ-панель</b>\n\n"
-        "Выберите действие:",
-        reply_markup=reply_markup,
-        parse_mode="HTML"
-    )
 
-    return MAIN_MENU
+async def _close_debug_file() -> None:
+    """Дописывает буфер в файл и закрывает его."""
+    global _debug_file, _last_update_key
+
+    await _flush_debug_buffer()
+    _last_update_key = None
+
+    async with _debug_lock:
+        if _debug_file is not None:
+            await asyncio.get_running_loop().run_in_executor(None, _debug_file.close)
+            _debug_file = None
+
+
+def _write_chunk(chunk: bytes) -> None:
+    """Записывает блок строк в файл дебаг-лога (выполняется в пуле потоков)."""
+    _debug_file.write(chunk)
+    _debug_file.flush()
+
+
+def _emit_repeats() -> None:
+    """Добавляет в буфер строку с числом пропущенных повторов, если они были."""
+    global _repeat_count
+    if _repeat_count:
+        _debug_buffer.append(_dump_json_line({"timestamp": datetime.now(), "repeated": _repeat_count}))
+        _repeat_count = 0
+
+
+async def _flush_debug_buffer() -> None:
+    """Переносит все накопленные строки из буфера в файл одной записью."""
+    async with _debug_lock:
+        _emit_repeats()
+        if not _debug_buffer or _debug_file is None:
+            return
+
+        lines = [_debug_buffer.popleft() for _ in range(len(_debug_buffer))]
+        await asyncio.get_running_loop().run_in_executor(None, _write_chunk, b"".join(lines))
+
+
+async def _debug_flusher() -> None:
+    """Фоновая задача периодической записи буфера дебаг-лога."""
+    while True:
+        try:
+            await asyncio.wait_for(_debug_flush_event.wait(), timeout=DEBUG_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _debug_flush_event.clear()
+
+        try:
+            await _flush_debug_buffer()
+        except Exception as e:
+            logger.error(f"Ошибка записи дебаг-лога: {e}", exc_info=True)
+
+
+def start_debug_flusher() -> None:
+    """Запускает фоновую запись дебаг-лога (вызывается из post_init бота)."""
+    global _debug_flusher_task
+    if _debug_flusher_task is None:
+        _debug_flusher_task = asyncio.create_task(_debug_flusher())
+
+
+async def stop_debug_flusher() -> None:
+    """Останавливает фоновую запись и дописывает остаток буфера в файл."""
+    global _debug_flusher_task
+
+    if _debug_flusher_task is not None:
+        _debug_flusher_task.cancel()
+        try:
+            await _debug_flusher_task
+        except asyncio.CancelledError:
+            pass
+        _debug_flusher_task = None
+
+    await _close_debug_file()
+
+
+if orjson is not None:
+    def _dump_json_line(data: Dict[str, Any]) -> bytes:
+        """Сериализует данные в JSON-строку с переводом строки (orjson)."""
+        return orjson.dumps(data, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_OMIT_MICROSECONDS)
+else:
+    def _dump_json_line(data: Dict[str, Any]) -> bytes:
+        """Сериализует данные в JSON-строку с переводом строки (стандартный json)."""
+        line = json.dumps(data, ensure_ascii=False, default=lambda o: o.isoformat(timespec="seconds"))
+        return (line + "\n").encode("utf-8")
 
 
 def log_update_to_file(update: Update) -> None:
-    """Логирует информацию об update в файл."""
-    global DEBUG_MODE, DEBUG_FILE_PATH
+    """Добавляет информацию об update в буфер дебаг-лога."""
+    global _last_update_key, _repeat_count
 
     if not DEBUG_MODE:
         return
 
     try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Повтор предыдущего update только увеличивает счетчик
+        msg = update.message
+        cq = update.callback_query
+        if msg is not None:
+            # Сообщения без текста (медиа и т.п.) не сравниваем
+            key = (msg.chat_id, msg.from_user.id if msg.from_user else None, msg.text, None) \
+                if msg.text is not None else None
+        elif cq is not None:
+            key = (None, cq.from_user.id if cq.from_user else None, None, cq.data)
+        else:
+            key = None
+
+        if key is not None and key == _last_update_key:
+            _repeat_count += 1
+            return
+        _emit_repeats()
+        _last_update_key = key
 
         # Формируем данные для записи
-        log_data = {
-            "timestamp": timestamp,
-            "update_id": update.update_id,
-        }
+        log_data = _log_tmp
+        log_data.clear()
+        log_data["timestamp"] = datetime.now()
+        log_data["update_id"] = update.update_id
 
         # Информация о сообщении
-        if update.message:
-            msg = update.message
-            log_data["message"] = {
-                "message_id": msg.message_id,
-                "chat_id": msg.chat.id,
-                "chat_type": msg.chat.type,
-                "chat_title": msg.chat.title,
-                "message_thread_id": msg.message_thread_id,
-                "from_user_id": msg.from_user.id if msg.from_user else None,
-                "from_user_name": msg.from_user.full_name if msg.from_user else None,
-                "from_user_username": msg.from_user.username if msg.from_user else None,
-                "text": msg.text,
-                "date": msg.date.isoformat() if msg.date else None,
-            }
+        if msg is not None:
+            user = msg.from_user
+            d = _log_msg_tmp
+            d["message_id"] = msg.message_id
+            d["chat_id"] = msg.chat.id
+            d["chat_type"] = msg.chat.type
+            d["chat_title"] = msg.chat.title
+            d["message_thread_id"] = msg.message_thread_id
+            d["from_user_id"] = user.id if user else None
+            d["from_user_name"] = user.full_name if user else None
+            d["from_user_username"] = user.username if user else None
+            d["text"] = msg.text
+            d["date"] = msg.date
+            log_data["message"] = d
 
         # Информация о callback query
-        if update.callback_query:
-            cq = update.callback_query
-            log_data["callback_query"] = {
-                "id": cq.id,
-                "data": cq.data,
-                "chat_id": cq.message.chat.id if cq.message else None,
-                "from_user_id": cq.from_user.id if cq.from_user else None,
-            }
-
-        # Записываем в файл
-        with open(DEBUG_FILE_PATH, "a", encoding="utf-8") as f:
-            f.write(f"\n{'='*80}\n")
-            f.write(json.dumps(log_data, ensure_ascii=False, indent=2))
-            f.write(f"\n{'='*80}\n")
-
-        logger.info(f"Update {update.update_id} залогирован в {DEBUG_FILE_PATH}")
+        if cq is not None:
+            d = _log_cq_tmp
+            d["id"] = cq.id
+            d["data"] = cq.data
+            d["chat_id"] = cq.message.chat.id if cq.message else None
+            d["from_user_id"] = cq.from_user.id if cq.from_user else None
+            log_data["callback_query"] = d
+
+        # Одна JSON-строка на update, запись выполняет фоновая задача
+        _debug_buffer.append(_dump_json_line(log_data))
+        if len(_debug_buffer) >= DEBUG_FLUSH_THRESHOLD:
+            _debug_flush_event.set()
 
     except Exception as e:
         logger.error(f"Ошибка при логировании update: {e}", exc_info=True)
@@ -890,8 +1196,9 @@ async def toggle_debug_mode(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user = update.effective_user
 
     if DEBUG_MODE:
-        # Выключаем дебаг-режим и отправляем файл
+        # Выключаем дебаг-режим, дописываем буфер и отправляем файл
         DEBUG_MODE = False
+        await _close_debug_file()
 
         # Проверяем, существует ли файл
         if os.path.exists(DEBUG_FILE_PATH):
@@ -912,20 +1219,20 @@ async def toggle_debug_mode(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 await query.edit_message_text(
                     "✅ <b>Режим отладки выключен</b>\n\n"
                     "Файл с логами отправлен вам в личные сообщения.",
-                    parse_mode="HTML"
+                    parse_mode=ParseMode.HTML
                 )
             except Exception as e:
                 logger.error(f"Ошибка при отправке файла: {e}", exc_info=True)
                 await query.edit_message_text(
                     f"❌ Ошибка при отправке файла: {e}\n\n"
                     f"Файл сохранен в: {DEBUG_FILE_PATH}",
-                    parse_mode="HTML"
+                    parse_mode=ParseMode.HTML
                 )
         else:
             await query.edit_message_text(
                 "⚠️ <b>Режим отладки выключен</b>\n\n"
                 "Файл логов не найден (возможно, не было обновлений).",
-                parse_mode="HTML"
+                parse_mode=ParseMode.HTML
             )
     else:
         # Включаем дебаг-режим
@@ -934,6 +1241,8 @@ async def toggle_debug_mode(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Создаем новый файл с заголовком
         with open(DEBUG_FILE_PATH, "w", encoding="utf-8") as f:
             f.write(f"DEBUG LOG - Started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        _debug_buffer.clear()
+        _open_debug_file()
 
         logger.info(f"Дебаг-режим включен пользователем {user.id}")
 
@@ -941,74 +1250,83 @@ async def toggle_debug_mode(update: Update, context: ContextTypes.DEFAULT_TYPE)
             "✅ <b>Режим отладки включен</b>\n\n"
             f"Все обновления будут записываться в файл.\n"
             f"Для остановки нажмите кнопку еще раз.",
-            parse_mode="HTML"
+            parse_mode=ParseMode.HTML
         )
 
     # Возвращаемся в главное меню через 2 секунды
-    import asyncio
     await asyncio.sleep(2)
     return await back_to_main(update, context)
 
 
-def get_admin_conversation_handler():
-    """Возвращает ConversationHandler для админ-панели."""
-    return ConversationHandler(
-        entry_points=[
-            CommandHandler("start", start_command),
-            CommandHandler("admin", admin_command)
+# ConversationHandler админ-панели создается один раз при импорте модуля:
+# паттерны CallbackQueryHandler компилируются вместе с остальным кодом
+ADMIN_CONVERSATION_HANDLER = ConversationHandler(
+    entry_points=[
+        CommandHandler("start", start_command),
+        CommandHandler("admin", admin_command, filters=ADMIN_USER_FILTER),
+        CommandHandler("admin", ignore_admin_command, filters=~ADMIN_USER_FILTER),
+    ],
+    states={
+        MAIN_MENU: [
+            CallbackQueryHandler(show_topics_menu, pattern="^menu_topics$"),
+            CallbackQueryHandler(show_source_chats_menu, pattern="^menu_source_chats$"),
+            CallbackQueryHandler(start_set_target_chat, pattern="^set_target_chat$"),
+            CallbackQueryHandler(show_stats, pattern="^show_stats$"),
+            CallbackQueryHandler(toggle_debug_mode, pattern="^toggle_debug$"),
+            CallbackQueryHandler(back_to_main, pattern="^back_to_main$"),
+            CallbackQueryHandler(close_menu, pattern="^close$"),
+        ],
+        TOPICS_MENU: [
+            CallbackQueryHandler(start_add_topic, pattern="^add_topic$"),
+            CallbackQueryHandler(start_edit_topic, pattern="^edit_topic$"),
+            CallbackQueryHandler(start_delete_topic, pattern="^delete_topic$"),
+            CallbackQueryHandler(back_to_main, pattern="^back_to_main$"),
         ],
-        states={
-            MAIN_MENU: [
-                CallbackQueryHandler(show_topics_menu, pattern="^menu_topics$"),
-                CallbackQueryHandler(show_source_chats_menu, pattern="^menu_source_chats$"),
-                CallbackQueryHandler(start_set_target_chat, pattern="^set_target_chat$"),
-                CallbackQueryHandler(show_stats, pattern="^show_stats$"),
-                CallbackQueryHandler(toggle_debug_mode, pattern="^toggle_debug$"),
-                CallbackQueryHandler(back_to_main, pattern="^back_to_main$"),
-                CallbackQueryHandler(close_menu, pattern="^close$"),
-            ],
-            TOPICS_MENU: [
-                CallbackQueryHandler(start_add_topic, pattern="^add_topic$"),
-                CallbackQueryHandler(start_edit_topic, pattern="^edit_topic$"),
-                CallbackQueryHandler(start_delete_topic, pattern="^delete_topic$"),
-                CallbackQueryHandler(back_to_main, pattern="^back_to_main$"),
-            ],
-            SOURCE_CHATS_MENU: [
-                CallbackQueryHandler(start_add_source_chat, pattern="^add_source_chat$"),
-                CallbackQueryHandler(start_delete_source_chat, pattern="^delete_source_chat$"),
-                CallbackQueryHandler(back_to_main, pattern="^back_to_main$"),
-            ],
-            WAITING_TOPIC_DATA: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, process_add_topic),
-                CommandHandler("cancel", cancel),
-            ],
-            WAITING_TOPIC_PREFIX: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, process_delete_topic),
-                CommandHandler("cancel", cancel),
-            ],
-            WAITING_TOPIC_EDIT_PREFIX: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, process_edit_topic_prefix),
-                CommandHandler("cancel", cancel),
-            ],
-            WAITING_TOPIC_EDIT_DATA: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, process_edit_topic_data),
-                CommandHandler("cancel", cancel),
-            ],
-            WAITING_SOURCE_CHAT_DATA: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, process_add_source_chat),
-                CommandHandler("cancel", cancel),
-            ],
-            DELETE_SOURCE_CHAT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, process_delete_source_chat),
-                CommandHandler("cancel", cancel),
-            ],
-            SET_TARGET_CHAT: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, process_set_target_chat),
-                CommandHandler("cancel", cancel),
-            ],
-        },
-        fallbacks=[
+        SOURCE_CHATS_MENU: [
+            CallbackQueryHandler(start_add_source_chat, pattern="^add_source_chat$"),
+            CallbackQueryHandler(start_delete_source_chat, pattern="^delete_source_chat$"),
+            CallbackQueryHandler(source_chats_next_page, pattern="^src_page_next$"),
+            CallbackQueryHandler(source_chats_prev_page, pattern="^src_page_prev$"),
+            CallbackQueryHandler(back_to_main, pattern="^back_to_main$"),
+        ],
+        WAITING_TOPIC_DATA: [
+            MessageHandler(filters.TEXT & ~filters.COMMAND, process_add_topic),
             CommandHandler("cancel", cancel),
-            MessageHandler(filters.COMMAND, handle_unknown_command),
         ],
-    )
+        WAITING_TOPIC_PREFIX: [
+            MessageHandler(filters.TEXT & ~filters.COMMAND, process_delete_topic),
+            CommandHandler("cancel", cancel),
+        ],
+        WAITING_TOPIC_EDIT_PREFIX: [
+            MessageHandler(filters.TEXT & ~filters.COMMAND, process_edit_topic_prefix),
+            CommandHandler("cancel", cancel),
+        ],
+        WAITING_TOPIC_EDIT_DATA: [
+            MessageHandler(filters.TEXT & ~filters.COMMAND, process_edit_topic_data),
+            CommandHandler("cancel", cancel),
+        ],
+        WAITING_SOURCE_CHAT_DATA: [
+            MessageHandler(filters.TEXT & ~filters.COMMAND, process_add_source_chat),
+            CommandHandler("cancel", cancel),
+        ],
+        DELETE_SOURCE_CHAT: [
+            MessageHandler(filters.TEXT & ~filters.COMMAND, process_delete_source_chat),
+            CallbackQueryHandler(delete_source_chat_next_page, pattern="^src_page_next$"),
+            CallbackQueryHandler(delete_source_chat_prev_page, pattern="^src_page_prev$"),
+            CommandHandler("cancel", cancel),
+        ],
+        SET_TARGET_CHAT: [
+            MessageHandler(filters.TEXT & ~filters.COMMAND, process_set_target_chat),
+            CommandHandler("cancel", cancel),
+        ],
+    },
+    fallbacks=[
+        CommandHandler("cancel", cancel),
+        MessageHandler(filters.COMMAND & ADMIN_USER_FILTER, handle_unknown_command),
+    ],
+)
+
+
+def get_admin_conversation_handler() -> ConversationHandler:
+    """Возвращает ConversationHandler для админ-панели."""
+    return ADMIN_CONVERSATION_HANDLER
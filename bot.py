@@ -4,11 +4,17 @@ Telegram бот для перенаправления сообщений меж
 Перехватывает сообщения, начинающиеся с "/" и отправляет их в разные темы чата.
 """
 
+import asyncio
 import os
+import sys
 import logging
-import re
+import string
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 from dotenv import load_dotenv
-from telegram import Update
+from telegram import Bot, Update
+from telegram.constants import MessageLimit
+from telegram.error import RetryAfter
 from telegram.ext import (
     Application,
     MessageHandler,
@@ -17,19 +23,26 @@ from telegram.ext import (
 )
 from database import Database
 import admin
-from admin import init_admin, get_admin_conversation_handler
+from admin import (
+    init_admin,
+    get_admin_conversation_handler,
+    log_update_to_file,
+    prefix_sort_key,
+    start_debug_flusher,
+    stop_debug_flusher,
+)
 from migrate import run_migrations
 
-# Настройка логирования
+# Загрузка переменных окружения
+load_dotenv()
+
+# Настройка логирования (по умолчанию WARNING: INFO пишет строку на каждое сообщение)
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+    level=os.getenv('LOG_LEVEL', 'WARNING').upper()
 )
 logger = logging.getLogger(__name__)
 
-# Загрузка переменных окружения
-load_dotenv()
-
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 DATABASE_URL = os.getenv('DATABASE_URL')
 ADMIN_IDS_STR = os.getenv('ADMIN_IDS', '')
@@ -52,13 +65,230 @@ SOURCE_CHATS = set()
 TARGET_CHAT_ID = None
 INCLUDE_SENDER_INFO = True
 SENDER_FORMAT = "{message}\nОтправил: {sender_name} ({sender_username})"
-DEFAULT_TOPIC_ID = None
+SenderRenderer = Callable[[Dict[str, Any]], str]
+
+# Маркер неизвестного префикса (topic_id сам может быть None)
+_UNKNOWN = object()
+
+# Ответ на неизвестный префикс, пересобирается при изменении топиков
+AVAILABLE_PREFIXES_TEXT = "Такой темы нет, список доступных: "
+
+
+# Фоновые задачи отправки: asyncio хранит на задачи только слабые ссылки
+_pending: Set[asyncio.Task] = set()
+
+
+def _on_send_done(task: asyncio.Task) -> None:
+    """Убирает завершенную отправку из _pending и логирует ее ошибку."""
+    _pending.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Ошибка при отправке сообщения: {task.exception()}", exc_info=task.exception())
+
+
+def send_in_background(coro: Awaitable[Any]) -> asyncio.Task:
+    """Запускает отправку в фоне, чтобы обработчик не ждал ответа Telegram API."""
+    task = asyncio.create_task(coro)
+    _pending.add(task)
+    task.add_done_callback(_on_send_done)
+    return task
+
+
+# Очередь пересылаемых сообщений: (chat_id, topic_id, text).
+# Сообщения в одну тему, пришедшие в пределах OUTGOING_BATCH_WINDOW,
+# склеиваются в одно, чтобы реже упираться в лимиты Telegram на отправку в группу
+OUTGOING_QUEUE_SIZE = 1000
+OUTGOING_BATCH_WINDOW = 0.25
+OUTGOING_BATCH_SEPARATOR = "\n\n"
+OUTGOING_DRAIN_TIMEOUT = 5.0
+# Не чаще одного сообщения в OUTGOING_CHAT_INTERVAL секунд в один чат
+# (лимит Telegram для групп - около 20 сообщений в минуту)
+OUTGOING_CHAT_INTERVAL = 3.0
+# Сколько раз повторять отправку после RetryAfter (flood control)
+OUTGOING_MAX_RETRIES = 5
+
+_outgoing: "asyncio.Queue[Tuple[Any, Optional[int], str]]" = asyncio.Queue(maxsize=OUTGOING_QUEUE_SIZE)
+_sender_task: Optional[asyncio.Task] = None
+# Время последней отправки в каждый чат (loop.time())
+_last_send_at: Dict[Any, float] = {}
+
+
+def _merge_texts(texts: List[str]) -> List[str]:
+    """Склеивает тексты в сообщения, не превышающие лимит длины Telegram."""
+    merged = []
+    current = None
+    for text in texts:
+        if current is None:
+            current = text
+        elif len(current) + len(OUTGOING_BATCH_SEPARATOR) + len(text) <= MessageLimit.MAX_TEXT_LENGTH:
+            current += OUTGOING_BATCH_SEPARATOR + text
+        else:
+            merged.append(current)
+            current = text
+    if current is not None:
+        merged.append(current)
+    return merged
+
+
+async def _send_paced(bot: Bot, chat_id: Any, topic_id: Optional[int], text: str) -> None:
+    """
+    Отправляет сообщение с паузой между отправками в один чат.
+
+    При RetryAfter ждет указанное Telegram время и повторяет отправку того же текста.
+    """
+    loop = asyncio.get_running_loop()
+
+    for attempt in range(1, OUTGOING_MAX_RETRIES + 1):
+        delay = _last_send_at.get(chat_id, float('-inf')) + OUTGOING_CHAT_INTERVAL - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, message_thread_id=topic_id)
+            return
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            logger.warning(
+                f"Flood control при отправке в чат {chat_id}: повтор через {retry_after} с "
+                f"(попытка {attempt}/{OUTGOING_MAX_RETRIES})"
+            )
+            await asyncio.sleep(retry_after)
+        finally:
+            _last_send_at[chat_id] = loop.time()
+
+    logger.error(f"Сообщение в чат {chat_id} не отправлено после {OUTGOING_MAX_RETRIES} попыток")
+
+
+async def _sender_worker(bot: Bot) -> None:
+    """Забирает сообщения из очереди пачками и отправляет их по темам."""
+    loop = asyncio.get_running_loop()
+
+    while True:
+        chat_id, topic_id, text = await _outgoing.get()
+        batches = {(chat_id, topic_id): [text]}
+        taken = 1
+
+        # Добираем все, что успело прийти за окно склейки
+        deadline = loop.time() + OUTGOING_BATCH_WINDOW
+        while (timeout := deadline - loop.time()) > 0:
+            try:
+                chat_id, topic_id, text = await asyncio.wait_for(_outgoing.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batches.setdefault((chat_id, topic_id), []).append(text)
+            taken += 1
+
+        try:
+            for (chat_id, topic_id), texts in batches.items():
+                for chunk in _merge_texts(texts):
+                    try:
+                        await _send_paced(bot, chat_id, topic_id, chunk)
+                    except Exception as e:
+                        logger.error(f"Ошибка при отправке сообщения: {e}", exc_info=True)
+        finally:
+            for _ in range(taken):
+                _outgoing.task_done()
+
+
+def start_sender_worker(bot: Bot) -> None:
+    """Запускает фоновую отправку сообщений из очереди."""
+    global _sender_task
+    if _sender_task is None:
+        _sender_task = asyncio.create_task(_sender_worker(bot))
+
+
+async def stop_sender_worker() -> None:
+    """Дожидается отправки оставшихся сообщений и останавливает отправку."""
+    global _sender_task
+    if _sender_task is None:
+        return
+
+    try:
+        await asyncio.wait_for(_outgoing.join(), OUTGOING_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Не отправлено сообщений из очереди: {_outgoing.qsize()}")
+
+    _sender_task.cancel()
+    try:
+        await _sender_task
+    except asyncio.CancelledError:
+        pass
+    _sender_task = None
+
+
+# Пример значений для проверки шаблона при загрузке (те же ключи, что в handle_message)
+_SENDER_FORMAT_SAMPLE: Dict[str, Any] = {
+    'sender_name': "Неизвестный",
+    'sender_username': "нет username",
+    'sender_id': 0,
+    'message': "",
+}
+
+
+def compile_sender_format(template: str) -> SenderRenderer:
+    """
+    Разбирает шаблон SENDER_FORMAT один раз и возвращает функцию его отрисовки.
+
+    Результат совпадает с template.format(**values), но шаблон не разбирается
+    заново на каждое сообщение. Составные поля ({sender_name[0]}, {x.attr})
+    поддерживаются, вложенные поля в спецификации формата - нет.
+
+    Raises:
+        ValueError: если шаблон некорректен или не отрисовывается на примере значений
+    """
+    formatter = string.Formatter()
+    parts = []
+    for literal, field, spec, conversion in formatter.parse(template):
+        if spec and '{' in spec:
+            raise ValueError(f"вложенные поля в спецификации формата не поддерживаются: {spec}")
+        # Для простых имен - прямой доступ к словарю, для составных - разбор как в str.format
+        simple = field is not None and field.isidentifier()
+        parts.append((literal, field, simple, spec or '', conversion))
+
+    def render(values: Dict[str, Any]) -> str:
+        out = []
+        for literal, field, simple, spec, conversion in parts:
+            out.append(literal)
+            if field is not None:
+                value = values[field] if simple else formatter.get_field(field, (), values)[0]
+                if conversion:
+                    value = formatter.convert_field(value, conversion)
+                out.append(format(value, spec))
+        return ''.join(out)
+
+    # Ошибки в именах полей должны всплыть при загрузке, а не на каждом сообщении
+    try:
+        render(_SENDER_FORMAT_SAMPLE)
+    except (KeyError, IndexError, AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f"шаблон не отрисовывается: {e!r}") from e
+
+    return render
+
+
+_RENDER_SENDER: SenderRenderer = compile_sender_format(SENDER_FORMAT)
+
+
+def rebuild_available_prefixes_text() -> None:
+    """Пересобирает ответ со списком доступных префиксов по текущему кэшу топиков."""
+    global AVAILABLE_PREFIXES_TEXT
+
+    if TOPIC_NAMES:
+        # Показываем маппинг: цифра → название
+        AVAILABLE_PREFIXES_TEXT = "Такой темы нет, список доступных:\n" + "\n".join(
+            f"/{p} → {TOPIC_NAMES.get(p, p)}" for p in sorted(TOPIC_ROUTING, key=prefix_sort_key)
+        )
+    else:
+        # Простой список префиксов
+        AVAILABLE_PREFIXES_TEXT = "Такой темы нет, список доступных: " + ", ".join(
+            f"/{p}" for p in sorted(TOPIC_ROUTING, key=prefix_sort_key)
+        )
 
 
 async def load_data_from_db():
     """Загружает данные из базы данных в кэш."""
     global TOPIC_ROUTING, TOPIC_NAMES, SOURCE_CHATS, TARGET_CHAT_ID
-    global INCLUDE_SENDER_INFO, SENDER_FORMAT, db
+    global INCLUDE_SENDER_INFO, SENDER_FORMAT, _RENDER_SENDER, db
 
     if db is None:
         logger.error("База данных не инициализирована!")
@@ -66,29 +296,120 @@ async def load_data_from_db():
 
     logger.info("Загрузка данных из базы данных...")
 
-    # Загрузка топиков
-    TOPIC_ROUTING = await db.get_topics()
-    TOPIC_NAMES = await db.get_topic_names()
-
-    # Загрузка исходных чатов
-    SOURCE_CHATS = await db.get_source_chats()
+    # Загрузка топиков, исходных чатов и конфигурации (параллельно)
+    (TOPIC_ROUTING, TOPIC_NAMES), SOURCE_CHATS, config = await asyncio.gather(
+        db.get_topics_full(),
+        db.get_source_chats(),
+        db.get_all_config(),
+    )
 
-    # Загрузка конфигурации
-    config = await db.get_all_config()
+    # Применение конфигурации
     TARGET_CHAT_ID = config.get('target_chat_id')
     INCLUDE_SENDER_INFO = config.get('include_sender_info', 'true').lower() == 'true'
-    SENDER_FORMAT = config.get('sender_format', SENDER_FORMAT)
+    sender_format = config.get('sender_format', SENDER_FORMAT)
+    try:
+        _RENDER_SENDER = compile_sender_format(sender_format)
+        SENDER_FORMAT = sender_format
+    except ValueError as e:
+        logger.error(f"Некорректный sender_format, используется прежний шаблон: {e}")
+
+    rebuild_available_prefixes_text()
 
     logger.info(f"Загружено топиков: {len(TOPIC_ROUTING)}")
     logger.info(f"Загружено исходных чатов: {len(SOURCE_CHATS)}")
     logger.info(f"Целевой чат: {TARGET_CHAT_ID}")
 
 
+async def invalidate_topic(prefix: str) -> bool:
+    """
+    Обновляет в кэше один топик после его изменения в БД.
+
+    Returns:
+        False если обновление невозможно и нужна полная перезагрузка
+    """
+    if db is None:
+        return False
+
+    row = await db.get_topic(prefix)
+    key = prefix.lower()
+
+    if row is None:
+        TOPIC_ROUTING.pop(key, None)
+        TOPIC_NAMES.pop(key, None)
+    else:
+        TOPIC_ROUTING[key] = row['topic_id']
+        TOPIC_NAMES[key] = row['name']
+
+    rebuild_available_prefixes_text()
+    return True
+
+
+async def invalidate_source_chat(chat_id: int) -> bool:
+    """
+    Обновляет в кэше один исходный чат после его изменения в БД.
+
+    Returns:
+        False если обновление невозможно и нужна полная перезагрузка
+    """
+    if db is None:
+        return False
+
+    if await db.is_source_chat_active(chat_id):
+        SOURCE_CHATS.add(chat_id)
+    else:
+        SOURCE_CHATS.discard(chat_id)
+
+    return True
+
+
+def set_target_chat(chat_id: str) -> None:
+    """Обновляет целевой чат в кэше."""
+    global TARGET_CHAT_ID
+    TARGET_CHAT_ID = chat_id
+
+
 async def debug_logger(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Универсальный обработчик для логирования всех апдейтов в дебаг-режиме.
     """
-    admin.log_update_to_file(update)
+    # DEBUG_MODE переключается из админки, поэтому читаем его из модуля admin
+    if admin.DEBUG_MODE:
+        log_update_to_file(update)
+
+
+def parse_command(text: str) -> Optional[Tuple[str, str]]:
+    """
+    Разбирает сообщение вида "/prefix остальное сообщение" без регулярных выражений.
+
+    Префикс - буквы, цифры и "_" (в том числе кириллица) сразу после "/",
+    содержимое - всё, что идет после префикса (может быть многострочным).
+
+    Returns:
+        Кортеж (prefix в нижнем регистре, content) или None, если это не команда
+    """
+    body = text[1:]
+    if not body or body[0].isspace():
+        return None
+
+    # Быстрый путь: "/prefix текст" - префикс отделен пробелом
+    parts = body.split(maxsplit=1)
+    prefix = parts[0]
+    if prefix.isalnum() or prefix.replace('_', 'a').isalnum():
+        content = parts[1].strip() if len(parts) > 1 else ''
+        # Обычно префикс уже в нижнем регистре: lower() всегда создает новую строку
+        return (prefix if prefix.islower() else prefix.lower()), content
+
+    # Редкий случай: сразу за префиксом идет знак препинания ("/sky,текст")
+    end = 0
+    for char in prefix:
+        if not (char.isalnum() or char == '_'):
+            break
+        end += 1
+    if end == 0:
+        return None
+
+    prefix = body[:end]
+    return (prefix if prefix.islower() else prefix.lower()), body[end:].strip()
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -101,7 +422,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
 
     # Проверяем, что сообщение из одного из исходных чатов
-    if str(message.chat_id) not in SOURCE_CHATS:
+    if message.chat_id not in SOURCE_CHATS:
         return
 
     # Проверяем, что сообщение начинается с "/"
@@ -111,80 +432,59 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     try:
         # Парсим сообщение: /prefix остальное сообщение
         # Пример: "/sky 27.5" -> prefix="sky", content="27.5"
-        match = re.match(r'^/(\w+)\s*(.*)$', message.text)
+        parsed = parse_command(message.text)
 
-        if not match:
-            logger.warning(f"Не удалось распарсить сообщение: {message.text}")
+        if parsed is None:
+            logger.warning("Не удалось распарсить сообщение: %s", message.text)
             return
 
-        prefix = match.group(1).lower()
-        content = match.group(2).strip()
-
-        # Проверяем, известен ли префикс
-        if prefix not in TOPIC_ROUTING:
-            # Формируем список доступных префиксов с названиями (если есть)
-            if TOPIC_NAMES:
-                # Показываем маппинг: цифра → название
-                available_list = []
-                for p in sorted(TOPIC_ROUTING.keys()):
-                    name = TOPIC_NAMES.get(p, p)
-                    available_list.append(f"/{p} → {name}")
-                response_text = "Такой темы нет, список доступных:\n" + "\n".join(available_list)
-            else:
-                # Простой список префиксов
-                available_prefixes = ', '.join([f'/{p}' for p in sorted(TOPIC_ROUTING.keys())])
-                response_text = f"Такой темы нет, список доступных: {available_prefixes}"
-
-            # Отправляем ответ в исходный чат
-            await context.bot.send_message(
+        prefix, content = parsed
+
+        # Определяем тему для отправки (один поиск по таблице маршрутизации)
+        topic_id = TOPIC_ROUTING.get(prefix, _UNKNOWN)
+        if topic_id is _UNKNOWN:
+            # Отправляем заранее собранный список доступных префиксов в исходный чат
+            send_in_background(context.bot.send_message(
                 chat_id=message.chat_id,
-                text=response_text,
+                text=AVAILABLE_PREFIXES_TEXT,
                 reply_to_message_id=message.message_id
-            )
+            ))
 
-            logger.info(f"Получен неизвестный префикс '{prefix}', отправлен список доступных")
+            logger.info("Получен неизвестный префикс '%s', отправлен список доступных", prefix)
             return
 
-        # Определяем тему для отправки
-        topic_id = TOPIC_ROUTING.get(prefix, DEFAULT_TOPIC_ID)
-
         # Получаем информацию об отправителе
         sender_name = "Неизвестный"
         sender_username = None
         sender_id = None
 
-        if message.from_user:
-            sender_name = message.from_user.full_name or "Неизвестный"
-            sender_username = f"@{message.from_user.username}" if message.from_user.username else None
-            sender_id = message.from_user.id
+        user = message.from_user
+        if user is not None:
+            sender_name = user.full_name or "Неизвестный"
+            username = user.username
+            sender_username = f"@{username}" if username else None
+            sender_id = user.id
 
         # Формируем текст для отправки
         if INCLUDE_SENDER_INFO:
-            forwarded_text = SENDER_FORMAT.format(
-                sender_name=sender_name,
-                sender_username=sender_username or "нет username",
-                sender_id=sender_id or "неизвестен",
-                message=content
-            )
+            forwarded_text = _RENDER_SENDER({
+                'sender_name': sender_name,
+                'sender_username': sender_username or "нет username",
+                'sender_id': sender_id or "неизвестен",
+                'message': content,
+            })
         else:
             forwarded_text = content
 
-        # Отправляем сообщение в целевой чат с указанием темы
-        kwargs = {
-            'chat_id': TARGET_CHAT_ID,
-            'text': forwarded_text
-        }
-
-        if topic_id is not None:
-            kwargs['message_thread_id'] = topic_id
+        # Ставим сообщение в очередь отправки в целевой чат с указанием темы
+        await _outgoing.put((TARGET_CHAT_ID, topic_id, forwarded_text))
 
-        await context.bot.send_message(**kwargs)
-
-        topic_info = f"тему {topic_id}" if topic_id else "основной чат"
-        logger.info(
-            f"Перенаправлено сообщение с префиксом '{prefix}' в {topic_info}: "
-            f"{content[:50]}... (от {sender_name})"
-        )
+        if logger.isEnabledFor(logging.INFO):
+            topic_info = f"тему {topic_id}" if topic_id else "основной чат"
+            logger.info(
+                "Перенаправлено сообщение с префиксом '%s' в %s: %.50s... (от %s)",
+                prefix, topic_info, content, sender_name
+            )
 
     except Exception as e:
         logger.error(f"Ошибка при отправке сообщения: {e}", exc_info=True)
@@ -204,7 +504,8 @@ async def post_init(application: Application) -> None:
     # Запуск миграций
     logger.info("Запуск миграций базы данных...")
     try:
-        run_migrations()
+        # Миграции синхронные (yoyo), поэтому выполняем их в отдельном потоке
+        await asyncio.to_thread(run_migrations)
     except Exception as e:
         logger.error(f"Ошибка при выполнении миграций: {e}", exc_info=True)
         raise
@@ -214,14 +515,25 @@ async def post_init(application: Application) -> None:
     await db.connect()
 
     # Инициализация админ-панели
-    init_admin(db, ADMIN_IDS)
+    # Передаем сам запущенный модуль: при запуске как скрипт он называется __main__
+    init_admin(db, ADMIN_IDS, sys.modules[__name__])
+    start_debug_flusher()
 
     # Загрузка данных из БД
     await load_data_from_db()
 
+    start_sender_worker(application.bot)
+
+
+async def post_stop(application: Application) -> None:
+    """Досылает сообщения из очереди, пока бот еще инициализирован."""
+    await stop_sender_worker()
+
 
 async def post_shutdown(application: Application) -> None:
     """Очистка ресурсов при завершении."""
+    await stop_debug_flusher()
+
     if db:
         await db.close()
 
@@ -243,6 +555,7 @@ def main() -> None:
 
     # Регистрация функций инициализации и завершения
     application.post_init = post_init
+    application.post_stop = post_stop
     application.post_shutdown = post_shutdown
 
     # Регистрация обработчика дебага (первым, с максимальным приоритетом, group=-1)
@@ -260,10 +573,12 @@ def main() -> None:
 #
 
     # Также обрабатываем команды отдельно
+    # block=False: пересылки независимы, PTB запускает их параллельно
     application.add_handler(
         MessageHandler(
             filters.COMMAND,
-            handle_message
+            handle_message,
+            block=False
         )
     )
 
@@ -1,15 +0,0 @@
-"""
-Конфигурация для бота.
-Здесь можно настроить дополнительные параметры.
-"""
-
-# Добавлять ли информацию об отправителе в перенаправленное сообщение
-INCLUDE_SENDER_INFO = True
-
-# Формат сообщения с информацией об отправителе
-# Доступные переменные: {sender_name}, {sender_username}, {sender_id}, {message}
-SENDER_FORMAT = "{message}\nОтправил: {sender_name} ({sender_username})"
-
-# ID темы по умолчанию (если префикс не найден в маршрутизации)
-# None = отправить в основной чат без темы
-DEFAULT_TOPIC_ID = None
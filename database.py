@@ -5,10 +5,31 @@
 
 import asyncpg
 import logging
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Запросы админ-панели к source_chats. Текст запросов постоянный, поэтому
+# asyncpg готовит каждый из них один раз на соединение и дальше берет
+# подготовленный statement из своего кэша (statement_cache_size).
+SQL_SOURCE_CHATS_PAGE = "SELECT chat_id, name, is_active FROM source_chats ORDER BY name LIMIT $1 OFFSET $2"
+SQL_SOURCE_CHATS_COUNT = "SELECT COUNT(*) FROM source_chats"
+SQL_DELETE_SOURCE_CHAT = "DELETE FROM source_chats WHERE chat_id = $1 RETURNING 1"
+
+
+async def _init_connection(conn: asyncpg.Connection):
+    """
+    Настраивает новое физическое соединение пула.
+
+    jit выставляется через SET, а не через server_settings: стартовые параметры
+    соединения, кроме стандартных, PgBouncer отклоняет.
+
+    Args:
+        conn: Новое соединение asyncpg
+    """
+    # Все запросы бота короткие: JIT для них только добавляет время компиляции
+    await conn.execute("SET jit = off")
+
 
 class Database:
     """Класс для работы с PostgreSQL базой данных."""
@@ -29,8 +50,16 @@ class Database:
             self.pool = await asyncpg.create_pool(
                 self.dsn,
                 min_size=2,
-                max_size=10,
-                command_timeout=60
+                max_size=20,
+                command_timeout=30,
+                max_inactive_connection_lifetime=300,
+                # Запросы выполняются через pool.fetch/fetchrow/execute: asyncpg готовит
+                # statement по тексту SQL один раз на соединение и берет его из кэша
+                statement_cache_size=256,
+                server_settings={
+                    'application_name': 'interceptor-bot',
+                },
+                init=_init_connection,
             )
             logger.info("Успешно подключено к базе данных")
         except Exception as e:
@@ -43,40 +72,84 @@ class Database:
             await self.pool.close()
             logger.info("Подключение к базе данных закрыто")
 
-    async def get_topics(self) -> Dict[str, int]:
+    async def get_topics_full(self) -> Tuple[Dict[str, int], Dict[str, str]]:
         """
-        Получает маппинг префиксов к topic_id.
+        Получает маппинги префиксов к topic_id и к названиям чатов одним запросом.
 
         Returns:
-            Словарь {prefix: topic_id}
+            Кортеж ({prefix: topic_id}, {prefix: name})
         """
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch("SELECT prefix, topic_id FROM topics ORDER BY prefix ASC")
-            return {row['prefix'].lower(): row['topic_id'] for row in rows}
-
-    async def get_topic_names(self) -> Dict[str, str]:
+        rows = await self.pool.fetch("SELECT prefix, name, topic_id FROM topics")
+        topics = {}
+        topic_names = {}
+        for row in rows:
+            prefix = row['prefix'].lower()
+            topics[prefix] = row['topic_id']
+            topic_names[prefix] = row['name']
+        return topics, topic_names
+
+    async def get_topic(self, prefix: str) -> Optional[asyncpg.Record]:
         """
-        Получает маппинг префиксов к названиям чатов.
+        Получает топик по префиксу (без учета регистра, как в кэше бота).
+
+        Args:
+            prefix: Префикс команды
 
         Returns:
-            Словарь {prefix: name}
+            Запись (prefix, name, topic_id) или None
         """
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch("SELECT prefix, name FROM topics")
-            return {row['prefix'].lower(): row['name'] for row in rows}
+        return await self.pool.fetchrow(
+            "SELECT prefix, name, topic_id FROM topics WHERE lower(prefix) = lower($1)", prefix
+        )
 
-    async def get_source_chats(self) -> Set[str]:
+    async def get_source_chats(self) -> Set[int]:
         """
         Получает список активных исходных чатов.
 
         Returns:
             Множество chat_id активных чатов
         """
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                "SELECT chat_id FROM source_chats WHERE is_active = TRUE"
-            )
-            return {row['chat_id'] for row in rows}
+        rows = await self.pool.fetch(
+            "SELECT chat_id FROM source_chats WHERE is_active = TRUE"
+        )
+        return {row['chat_id'] for row in rows}
+
+    async def get_source_chats_page(self, limit: int, offset: int) -> List[asyncpg.Record]:
+        """
+        Получает страницу исходных чатов (включая неактивные), отсортированных по названию.
+
+        Args:
+            limit: Количество чатов на странице
+            offset: Смещение от начала списка
+
+        Returns:
+            Список записей (chat_id, name, is_active)
+        """
+        return await self.pool.fetch(SQL_SOURCE_CHATS_PAGE, limit, offset)
+
+    async def count_source_chats(self) -> int:
+        """
+        Получает общее количество исходных чатов.
+
+        Returns:
+            Количество чатов (включая неактивные)
+        """
+        return await self.pool.fetchval(SQL_SOURCE_CHATS_COUNT)
+
+    async def is_source_chat_active(self, chat_id: int) -> bool:
+        """
+        Проверяет, существует ли исходный чат и активен ли он.
+
+        Args:
+            chat_id: ID чата в Telegram
+
+        Returns:
+            True если чат есть в БД и активен
+        """
+        is_active = await self.pool.fetchval(
+            "SELECT is_active FROM source_chats WHERE chat_id = $1", chat_id
+        )
+        return bool(is_active)
 
     async def get_config(self, key: str) -> Optional[str]:
         """
@@ -88,11 +161,10 @@ class Database:
         Returns:
             Значение конфигурации или None
         """
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "SELECT value FROM bot_config WHERE key = $1", key
-            )
-            return row['value'] if row else None
+        row = await self.pool.fetchrow(
+            "SELECT value FROM bot_config WHERE key = $1", key
+        )
+        return row['value'] if row else None
 
     async def get_all_config(self) -> Dict[str, str]:
         """
@@ -101,9 +173,8 @@ class Database:
         Returns:
             Словарь {key: value}
         """
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch("SELECT key, value FROM bot_config")
-            return {row['key']: row['value'] for row in rows}
+        rows = await self.pool.fetch("SELECT key, value FROM bot_config")
+        return {row['key']: row['value'] for row in rows}
 
     async def add_topic(self, prefix: str, name: str, topic_id: int) -> bool:
         """
@@ -118,19 +189,58 @@ class Database:
             True если успешно, False если префикс уже существует
         """
         try:
-            async with self.pool.acquire() as conn:
+            await self.pool.execute(
+                """
+                INSERT INTO topics (prefix, name, topic_id)
+                VALUES ($1, $2, $3)
+                """,
+                prefix, name, topic_id
+            )
+            logger.info(f"Добавлен топик: {prefix} -> {name} (topic_id: {topic_id})")
+            return True
+        except asyncpg.UniqueViolationError:
+            logger.warning(f"Топик с префиксом '{prefix}' уже существует")
+            return False
+
+    async def bulk_add_topics(self, rows: List[Tuple[str, str, int]]) -> List[str]:
+        """
+        Добавляет несколько топиков за один COPY.
+
+        Строки загружаются во временную таблицу, откуда переносятся в topics;
+        префиксы, которые уже есть в БД или повторяются в rows, пропускаются.
+
+        Args:
+            rows: Список кортежей (prefix, name, topic_id)
+
+        Returns:
+            Список добавленных префиксов
+        """
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
                 await conn.execute(
+                    """
+                    CREATE TEMP TABLE topics_import (
+                        prefix VARCHAR(50) NOT NULL,
+                        name VARCHAR(255) NOT NULL,
+                        topic_id INTEGER NOT NULL
+                    ) ON COMMIT DROP
+                    """
+                )
+                await conn.copy_records_to_table(
+                    'topics_import', records=rows, columns=['prefix', 'name', 'topic_id']
+                )
+                inserted = await conn.fetch(
                     """
                     INSERT INTO topics (prefix, name, topic_id)
-                    VALUES ($1, $2, $3)
-                    """,
-                    prefix, name, topic_id
+                    SELECT DISTINCT ON (prefix) prefix, name, topic_id FROM topics_import
+                    ON CONFLICT (prefix) DO NOTHING
+                    RETURNING prefix
+                    """
                 )
-                logger.info(f"Добавлен топик: {prefix} -> {name} (topic_id: {topic_id})")
-                return True
-        except asyncpg.UniqueViolationError:
-            logger.warning(f"Топик с префиксом '{prefix}' уже существует")
-            return False
+
+        prefixes = [row['prefix'] for row in inserted]
+        logger.info(f"Добавлено топиков: {len(prefixes)} из {len(rows)}")
+        return prefixes
 
     async def update_topic(self, prefix: str, name: Optional[str] = None,
                           topic_id: Optional[int] = None) -> bool:
@@ -165,18 +275,17 @@ class Database:
         updates.append(f"updated_at = CURRENT_TIMESTAMP")
         params.append(prefix)
 
-        query = f"UPDATE topics SET {', '.join(updates)} WHERE prefix = ${param_count}"
+        query = f"UPDATE topics SET {', '.join(updates)} WHERE lower(prefix) = lower(${param_count})"
 
-        async with self.pool.acquire() as conn:
-            result = await conn.execute(query, *params)
-            updated = result.split()[-1] == '1'
-            if updated:
-                logger.info(f"Обновлен топик: {prefix}")
-            return updated
+        result = await self.pool.execute(query, *params)
+        updated = result.split()[-1] == '1'
+        if updated:
+            logger.info(f"Обновлен топик: {prefix}")
+        return updated
 
     async def delete_topic(self, prefix: str) -> bool:
         """
-        Удаляет топик.
+        Удаляет топик (префикс сравнивается без учета регистра).
 
         Args:
             prefix: Префикс команды
@@ -184,16 +293,15 @@ class Database:
         Returns:
             True если успешно удалено
         """
-        async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                "DELETE FROM topics WHERE prefix = $1", prefix
-            )
-            deleted = result.split()[-1] == '1'
-            if deleted:
-                logger.info(f"Удален топик: {prefix}")
-            return deleted
-
-    async def add_source_chat(self, chat_id: str, name: Optional[str] = None) -> bool:
+        result = await self.pool.fetchval(
+            "DELETE FROM topics WHERE lower(prefix) = lower($1) RETURNING 1", prefix
+        )
+        deleted = result is not None
+        if deleted:
+            logger.info(f"Удален топик: {prefix}")
+        return deleted
+
+    async def add_source_chat(self, chat_id: int, name: Optional[str] = None) -> bool:
         """
         Добавляет исходный чат.
 
@@ -205,21 +313,35 @@ class Database:
             True если успешно
         """
         try:
-            async with self.pool.acquire() as conn:
-                await conn.execute(
-                    """
-                    INSERT INTO source_chats (chat_id, name)
-                    VALUES ($1, $2)
-                    """,
-                    chat_id, name
-                )
-                logger.info(f"Добавлен исходный чат: {chat_id} ({name})")
-                return True
+            await self.pool.execute(
+                """
+                INSERT INTO source_chats (chat_id, name)
+                VALUES ($1, $2)
+                """,
+                chat_id, name
+            )
+            logger.info(f"Добавлен исходный чат: {chat_id} ({name})")
+            return True
         except asyncpg.UniqueViolationError:
             logger.warning(f"Чат с ID '{chat_id}' уже существует")
             return False
 
-    async def toggle_source_chat(self, chat_id: str, is_active: bool) -> bool:
+    async def delete_source_chat(self, chat_id: int) -> bool:
+        """
+        Удаляет исходный чат.
+
+        Args:
+            chat_id: ID чата в Telegram
+
+        Returns:
+            True если успешно удалено
+        """
+        deleted = await self.pool.fetchval(SQL_DELETE_SOURCE_CHAT, chat_id) is not None
+        if deleted:
+            logger.info(f"Удален исходный чат: {chat_id}")
+        return deleted
+
+    async def toggle_source_chat(self, chat_id: int, is_active: bool) -> bool:
         """
         Активирует или деактивирует исходный чат.
 
@@ -230,20 +352,19 @@ class Database:
         Returns:
             True если успешно обновлено
         """
-        async with self.pool.acquire() as conn:
-            result = await conn.execute(
-                """
-                UPDATE source_chats
-                SET is_active = $1, updated_at = CURRENT_TIMESTAMP
-                WHERE chat_id = $2
-                """,
-                is_active, chat_id
-            )
-            updated = result.split()[-1] == '1'
-            if updated:
-                status = "активирован" if is_active else "деактивирован"
-                logger.info(f"Чат {chat_id} {status}")
-            return updated
+        result = await self.pool.execute(
+            """
+            UPDATE source_chats
+            SET is_active = $1, updated_at = CURRENT_TIMESTAMP
+            WHERE chat_id = $2
+            """,
+            is_active, chat_id
+        )
+        updated = result.split()[-1] == '1'
+        if updated:
+            status = "активирован" if is_active else "деактивирован"
+            logger.info(f"Чат {chat_id} {status}")
+        return updated
 
     async def set_config(self, key: str, value: str, description: Optional[str] = None) -> None:
         """
@@ -254,15 +375,14 @@ class Database:
             value: Значение
             description: Описание (опционально)
         """
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                """
-                INSERT INTO bot_config (key, value, description)
-                VALUES ($1, $2, $3)
-                ON CONFLICT (key)
-                DO UPDATE SET value = $2, description = COALESCE($3, bot_config.description),
-                              updated_at = CURRENT_TIMESTAMP
-                """,
-                key, value, description
-            )
-            logger.info(f"Установлена конфигурация: {key} = {value}")
+        await self.pool.execute(
+            """
+            INSERT INTO bot_config (key, value, description)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (key)
+            DO UPDATE SET value = $2, description = COALESCE($3, bot_config.description),
+                          updated_at = CURRENT_TIMESTAMP
+            """,
+            key, value, description
+        )
+        logger.info(f"Установлена конфигурация: {key} = {value}")
@@ -3,6 +3,11 @@
 Вспомогательный скрипт для получения ID темы (message_thread_id).
 Запустите этот скрипт и ответьте на сообщение в нужной теме,
 чтобы узнать её ID.
+
+Если задан PUBLIC_URL, скрипт получает обновления через webhook
+(слушает порт PORT, по умолчанию 8443; нужен python-telegram-bot[webhooks],
+см. README),
+иначе - через long polling.
 """
 
 import os
@@ -19,6 +24,23 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN')
+PUBLIC_URL = os.getenv('PUBLIC_URL')
+PORT = int(os.getenv('PORT', '8443'))
+
+# Шаблоны ответа (Markdown)
+_TMPL_WITH_TOPIC = (
+    "Chat ID: `{chat_id}`\n"
+    "Chat Type: {chat_type}\n"
+    "Topic ID: `{topic_id}`\n"
+    "Your ID: `{user_id}`"
+)
+_TMPL_NO_TOPIC = (
+    "Chat ID: `{chat_id}`\n"
+    "Chat Type: {chat_type}\n"
+    "Topic ID: N/A (это основной чат или группа без тем)\n"
+    "Your ID: `{user_id}`"
+)
+_LOG_SEPARATOR = "=" * 50
 
 
 async def print_topic_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -29,27 +51,28 @@ async def print_topic_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         user = message.from_user
         topic_id = message.message_thread_id
 
-        logger.info("=" * 50)
-        logger.info(f"Chat ID: {chat.id}")
-        logger.info(f"Chat Type: {chat.type}")
-        logger.info(f"Chat Title: {chat.title if chat.title else 'N/A'}")
-        logger.info(f"Topic/Thread ID: {topic_id if topic_id else 'N/A (основной чат)'}")
-        logger.info(f"User ID: {user.id if user else 'N/A'}")
-        logger.info(f"User Name: {user.full_name if user else 'N/A'}")
-        logger.info(f"Message: {message.text}")
-        logger.info("=" * 50)
-
-        response_text = (
-            f"Chat ID: `{chat.id}`\n"
-            f"Chat Type: {chat.type}\n"
-        )
-
-        if topic_id:
-            response_text += f"Topic ID: `{topic_id}`\n"
-        else:
-            response_text += "Topic ID: N/A (это основной чат или группа без тем)\n"
-
-        response_text += f"Your ID: `{user.id if user else 'N/A'}`"
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "\n%s\nChat ID: %s\nChat Type: %s\nChat Title: %s\nTopic/Thread ID: %s\n"
+                "User ID: %s\nUser Name: %s\nMessage: %s\n%s",
+                _LOG_SEPARATOR,
+                chat.id,
+                chat.type,
+                chat.title if chat.title else 'N/A',
+                topic_id if topic_id else 'N/A (основной чат)',
+                user.id if user else 'N/A',
+                user.full_name if user else 'N/A',
+                message.text,
+                _LOG_SEPARATOR
+            )
+
+        template = _TMPL_WITH_TOPIC if topic_id else _TMPL_NO_TOPIC
+        response_text = template.format_map({
+            'chat_id': chat.id,
+            'chat_type': chat.type,
+            'topic_id': topic_id,
+            'user_id': user.id if user else 'N/A',
+        })
 
         await message.reply_text(response_text, parse_mode='Markdown')
 
@@ -60,9 +83,30 @@ def main() -> None:
 
     logger.info("Бот запущен. Отправьте сообщение в нужную тему для получения её ID")
 
-    application = Application.builder().token(BOT_TOKEN).build()
-    application.add_handler(MessageHandler(filters.ALL, print_topic_info))
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    # Ответы независимы: обрабатываем апдейты параллельно, JobQueue скрипту не нужна
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(True)
+        .job_queue(None)
+        .build()
+    )
+    # Нужны только новые текстовые сообщения: остальные типы апдейтов не запрашиваем
+    application.add_handler(
+        MessageHandler(filters.TEXT & ~filters.COMMAND & filters.UpdateType.MESSAGE, print_topic_info)
+    )
+
+    if PUBLIC_URL:
+        # Telegram сам присылает обновления, без периодических запросов getUpdates
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=BOT_TOKEN,
+            webhook_url=f"{PUBLIC_URL.rstrip('/')}/{BOT_TOKEN}",
+            allowed_updates=[Update.MESSAGE]
+        )
+    else:
+        application.run_polling(allowed_updates=[Update.MESSAGE])
 
 
 if __name__ == '__main__':
@@ -5,6 +5,7 @@
 
 import os
 import logging
+from functools import lru_cache
 from yoyo import read_migrations, get_backend
 from dotenv import load_dotenv
 
@@ -14,6 +15,30 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 DATABASE_URL = os.getenv('DATABASE_URL')
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+
+
+# Backend создается лениво при первом запуске миграций, а не при импорте модуля:
+# иначе бот подключался бы к БД уже при "import migrate"
+@lru_cache(maxsize=4)
+def _backend(url: str):
+    """Возвращает backend yoyo для url (подключение создается один раз)."""
+    return get_backend(url)
+
+
+@lru_cache(maxsize=4)
+def _migrations(path: str):
+    """Возвращает список миграций из папки path (читается с диска один раз)."""
+    return read_migrations(path)
+
+
+def _get_backend(url: str):
+    """Возвращает закэшированный backend, переподключаясь, если соединение закрыто."""
+    backend = _backend(url)
+    if getattr(backend.connection, 'closed', False):
+        _backend.cache_clear()
+        backend = _backend(url)
+    return backend
 
 
 def run_migrations():
@@ -24,23 +49,35 @@ def run_migrations():
     logger.info(f"Подключение к базе данных для миграций...")
 
     # Получаем backend для подключения к БД
-    backend = get_backend(DATABASE_URL)
+    backend = _get_backend(DATABASE_URL)
 
     # Читаем миграции из папки migrations
-    migrations_dir = os.path.join(os.path.dirname(__file__), 'migrations')
-    migrations = read_migrations(migrations_dir)
+    migrations = _migrations(MIGRATIONS_DIR)
+
+    # Обычно применять нечего: проверяем без блокировки, чтобы не конкурировать
+    # за нее с другими экземплярами при одновременном запуске
+    to_apply = backend.to_apply(migrations)
+
+    if not to_apply:
+        logger.info("Миграций для применения не найдено")
+        return
+
+    # Применяем миграции по одной: блокировка держится только на время одной миграции,
+    # и уже примененные остаются примененными, если следующая упадет
+    total = len(to_apply)
+    logger.info(f"Применение {total} миграции(й)...")
+    for i, migration in enumerate(to_apply, 1):
+        with backend.lock():
+            # Другой экземпляр мог применить миграцию, пока блокировка была отпущена
+            if backend.is_applied(migration):
+                logger.info(f"{i}/{total} {migration.id} уже применена")
+                continue
+            backend.apply_one(migration)
+        logger.info(f"{i}/{total} {migration.id} применена")
 
-    # Применяем миграции
     with backend.lock():
-        to_apply = backend.to_apply(migrations)
-        to_apply_list = list(to_apply)
-
-        if to_apply_list:
-            logger.info(f"Применение {len(to_apply_list)} миграции(й)...")
-            backend.apply_migrations(to_apply_list)
-            logger.info("✅ Все миграции успешно применены")
-        else:
-            logger.info("Миграций для применения не найдено")
+        backend.run_post_apply(to_apply)
+    logger.info("✅ Все миграции успешно применены")
 
 
 if __name__ == '__main__':
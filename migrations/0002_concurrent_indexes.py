@@ -0,0 +1,29 @@
+"""
+Индексы, создаваемые без блокировки записи в таблицы
+"""
+
+from yoyo import step
+
+__depends__ = {'0001_initial_schema'}
+
+# CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции,
+# поэтому миграция нетранзакционная и каждый индекс - отдельный шаг
+__transactional__ = False
+
+steps = [
+    step(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_topics_prefix ON topics(prefix)",
+        # Rollback
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_topics_prefix"
+    ),
+    step(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_source_chats_chat_id ON source_chats(chat_id)",
+        # Rollback
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_source_chats_chat_id"
+    ),
+    step(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_source_chats_active ON source_chats(is_active)",
+        # Rollback
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_source_chats_active"
+    ),
+]
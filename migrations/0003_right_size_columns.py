@@ -0,0 +1,54 @@
+"""
+Уточнение типов колонок: числовой chat_id и ограничения длины
+"""
+
+from yoyo import step
+
+__depends__ = {'0002_concurrent_indexes'}
+
+
+def check_chat_ids(conn):
+    """Останавливает миграцию, если в source_chats есть нечисловые chat_id."""
+    cursor = conn.cursor()
+    # ::text - чтобы проверка работала и на уже числовой колонке
+    cursor.execute(
+        "SELECT chat_id::text FROM source_chats WHERE btrim(chat_id::text) !~ '^-?[0-9]+$'"
+    )
+    bad = [row[0] for row in cursor.fetchall()]
+    if bad:
+        raise ValueError(
+            "В source_chats есть chat_id, которые нельзя привести к BIGINT: "
+            + ", ".join(repr(chat_id) for chat_id in bad)
+            + ". Исправьте или удалите эти строки и запустите миграции снова."
+        )
+
+
+steps = [
+    step(check_chat_ids),
+    step(
+        # chat_id в Telegram - целое число (до 64 бит); пробелы по краям отбрасываем
+        "ALTER TABLE source_chats ALTER COLUMN chat_id TYPE BIGINT USING btrim(chat_id::text)::BIGINT",
+        # Rollback
+        "ALTER TABLE source_chats ALTER COLUMN chat_id TYPE VARCHAR(100) USING chat_id::TEXT"
+    ),
+    step(
+        # Ограничения длины проверяются только для новых и измененных строк (NOT VALID).
+        # DROP IF EXISTS - на случай БД, созданной из schema.sql, где они уже есть
+        """
+        ALTER TABLE topics
+            ALTER COLUMN prefix TYPE TEXT,
+            DROP CONSTRAINT IF EXISTS topics_prefix_length,
+            ADD CONSTRAINT topics_prefix_length CHECK (length(prefix) <= 16) NOT VALID;
+        ALTER TABLE bot_config
+            DROP CONSTRAINT IF EXISTS bot_config_value_length,
+            ADD CONSTRAINT bot_config_value_length CHECK (length(value) < 4096) NOT VALID
+        """,
+        # Rollback
+        """
+        ALTER TABLE bot_config DROP CONSTRAINT IF EXISTS bot_config_value_length;
+        ALTER TABLE topics
+            DROP CONSTRAINT IF EXISTS topics_prefix_length,
+            ALTER COLUMN prefix TYPE VARCHAR(50)
+        """
+    ),
+]
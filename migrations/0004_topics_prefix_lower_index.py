@@ -0,0 +1,20 @@
+"""
+Индекс по lower(prefix) для поиска топика без учета регистра
+"""
+
+from yoyo import step
+
+__depends__ = {'0003_right_size_columns'}
+
+# CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+__transactional__ = False
+
+steps = [
+    step(
+        # get_topic, update_topic и delete_topic ищут по lower(prefix) = lower($1):
+        # обычный idx_topics_prefix для такого условия не подходит
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_topics_prefix_lower ON topics(lower(prefix))",
+        # Rollback
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_topics_prefix_lower"
+    ),
+]
@@ -3,7 +3,8 @@
 -- Таблица с информацией о топиках/темах
 CREATE TABLE IF NOT EXISTS topics (
     id SERIAL PRIMARY KEY,
-    prefix VARCHAR(50) UNIQUE NOT NULL,  -- Префикс команды (например, "1", "sky", "скай")
+    prefix TEXT UNIQUE NOT NULL           -- Префикс команды (например, "1", "sky", "скай")
+        CONSTRAINT topics_prefix_length CHECK (length(prefix) <= 16),
     name VARCHAR(255) NOT NULL,           -- Название чата/темы
     topic_id INTEGER NOT NULL,            -- message_thread_id в Telegram
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -13,7 +14,7 @@ CREATE TABLE IF NOT EXISTS topics (
 -- Таблица с информацией об исходных чатах
 CREATE TABLE IF NOT EXISTS source_chats (
     id SERIAL PRIMARY KEY,
-    chat_id VARCHAR(100) UNIQUE NOT NULL,  -- ID чата в Telegram
+    chat_id BIGINT UNIQUE NOT NULL,        -- ID чата в Telegram
     name VARCHAR(255),                     -- Название чата (опционально)
     is_active BOOLEAN DEFAULT TRUE,        -- Активен ли чат
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -24,7 +25,7 @@ CREATE TABLE IF NOT EXISTS source_chats (
 CREATE TABLE IF NOT EXISTS bot_config (
     id SERIAL PRIMARY KEY,
     key VARCHAR(100) UNIQUE NOT NULL,
-    value TEXT NOT NULL,
+    value TEXT NOT NULL CONSTRAINT bot_config_value_length CHECK (length(value) < 4096),
     description TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -32,6 +33,7 @@ CREATE TABLE IF NOT EXISTS bot_config (
 
 -- Индексы для быстрого поиска
 CREATE INDEX IF NOT EXISTS idx_topics_prefix ON topics(prefix);
+CREATE INDEX IF NOT EXISTS idx_topics_prefix_lower ON topics(lower(prefix));
 CREATE INDEX IF NOT EXISTS idx_source_chats_chat_id ON source_chats(chat_id);
 CREATE INDEX IF NOT EXISTS idx_source_chats_active ON source_chats(is_active);
 
@@ -51,6 +53,6 @@ ON CONFLICT (key) DO NOTHING;
 --     ('5', 'Скай', 289);
 
 -- INSERT INTO source_chats (chat_id, name) VALUES
---     ('-1003698440205', 'Trust'),
---     ('-1002833859726', 'Sky'),
---     ('-1003121441569', 'Vegan');
+--     (-1003698440205, 'Trust'),
+--     (-1002833859726, 'Sky'),
+--     (-1003121441569, 'Vegan');